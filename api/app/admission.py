@@ -0,0 +1,357 @@
+# api/app/admission.py
+"""Admission control: priority lanes with their own limits, queues and shedding.
+
+Requests are classified into lanes by route:
+
+- inference: uploads that decode/transcode and embed (heavy)
+- match:     match computation
+- light:     everything else, i.e. operator reads and decisions
+
+Each lane has its own concurrency limit and a bounded FIFO queue, so an upload
+burst can only fill the inference lane. Inference and match also draw from a
+per-process CPU budget (threads in use); waiting match requests are served
+before waiting uploads. The light lane costs nothing from the budget.
+
+A request is shed with 503 + Retry-After when its lane queue is full, when the
+estimated wait exceeds the lane's latency target, or when it actually waited
+that long. Streaming and chunk-upload routes are not admitted here: they are
+I/O bound and would hold slots for their whole duration. File uploads are
+admitted by their handler (`run`) once the body has arrived, for the same
+reason.
+
+Work outside the request lanes draws from the same CPU budget: streamed
+liveness frames take it if it is free and no request is waiting, and are
+dropped otherwise (`try_acquire`), and media jobs wait for it at the lowest priority from their
+worker threads (`background_cpu`).
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import math
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from .config import settings
+
+INFERENCE, MATCH, LIGHT = "inference", "match", "light"
+
+_ROUTES = [
+    (INFERENCE, "POST", re.compile(r"^/sessions/[^/]+/(face-image|document-image|liveness-video)$")),
+    (INFERENCE, "POST", re.compile(r"^/users/[^/]+/(liveness-video|document-image)$")),
+    (INFERENCE, "POST", re.compile(r"^/uploads/[^/]+/finalize$")),
+    (MATCH, "POST", re.compile(r"^/(sessions|users)/[^/]+/match/compute$")),
+]
+# Admitted in the handler, after the (possibly slow) upload body has been read.
+_IN_HANDLER = [
+    ("POST", re.compile(r"^/sessions/[^/]+/(face-image|document-image|liveness-video)$")),
+    ("POST", re.compile(r"^/users/[^/]+/(liveness-video|document-image)$")),
+]
+_BYPASS = [
+    (None, re.compile(r"^/(health|metrics/.*)$")),
+    ("GET", re.compile(r"^/events/status$")),
+    ("PATCH", re.compile(r"^/uploads/[^/]+$")),
+    ("HEAD", re.compile(r"^/uploads/[^/]+$")),
+]
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Lane for a request, or None if it bypasses admission control."""
+    for m, rx in _BYPASS:
+        if (m is None or m == method) and rx.match(path):
+            return None
+    for lane, m, rx in _ROUTES:
+        if m == method and rx.match(path):
+            return lane
+    return LIGHT
+
+
+def admitted_in_handler(method: str, path: str) -> bool:
+    return any(m == method and rx.match(path) for m, rx in _IN_HANDLER)
+
+
+class Shed(Exception):
+    def __init__(self, lane: str, retry_after: float, reason: str) -> None:
+        self.lane = lane
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class CpuBudget:
+    """Weighted semaphore; waiters are woken by priority (lower first), then arrival."""
+
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.used = 0
+        self._waiters: list[tuple[int, int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for *_, f in self._waiters if not f.done())
+
+    def try_acquire(self, cost: int, priority: int) -> bool:
+        """Take `cost` if it is free now and nobody of the same or higher priority is waiting."""
+        if self.used + cost > self.total:
+            return False
+        if any(p <= priority and not f.done() for p, _, _, f in self._waiters):
+            return False
+        self.used += cost
+        return True
+
+    async def acquire(self, cost: int, priority: int) -> None:
+        if self.try_acquire(cost, priority):
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), cost, fut))
+        # Lower-priority waiters can leave budget free; this one may now head the queue and fit.
+        self._wake()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(cost)  # granted just as we gave up
+            else:
+                self._wake()
+            raise
+
+    def release(self, cost: int) -> None:
+        self.used -= cost
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            _, _, cost, fut = self._waiters[0]
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.used + cost > self.total:
+                return
+            heapq.heappop(self._waiters)
+            self.used += cost
+            fut.set_result(None)
+
+
+@dataclass
+class Lane:
+    name: str
+    concurrency: int
+    queue_limit: int
+    target_s: float
+    cost: int
+    priority: int
+    in_flight: int = 0
+    queued: int = 0
+    admitted: int = 0
+    shed: int = 0
+    service_s: float = 0.0  # EWMA of time holding a slot
+    queue_times: deque = field(default_factory=lambda: deque(maxlen=1000))
+    _sem: Optional[asyncio.Semaphore] = None
+
+    def sem(self) -> asyncio.Semaphore:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        return self._sem
+
+    def estimated_wait(self) -> float:
+        if self.in_flight < self.concurrency and not self.queued:
+            return 0.0
+        return (self.queued + 1) / self.concurrency * self.service_s
+
+    def stats(self) -> dict:
+        qt = sorted(self.queue_times)
+
+        def pct(p: float) -> Optional[float]:
+            return round(qt[min(len(qt) - 1, int(p * len(qt)))] * 1000, 1) if qt else None
+
+        return {
+            "concurrency": self.concurrency,
+            "queue_limit": self.queue_limit,
+            "target_ms": round(self.target_s * 1000),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "queue_ms_p50": pct(0.50),
+            "queue_ms_p95": pct(0.95),
+            "queue_ms_max": round(qt[-1] * 1000, 1) if qt else None,
+            "service_ms_avg": round(self.service_s * 1000, 1),
+        }
+
+
+def _cpu_count() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Below every lane: media jobs only get CPU budget nobody else is waiting for.
+BACKGROUND_PRIORITY = 9
+
+
+class Controller:
+    def __init__(self) -> None:
+        budget = settings.ADMISSION_CPU_BUDGET or _cpu_count()
+        inference_cost = min(settings.ORT_INTRA_OP_THREADS, budget)
+        self.budget = CpuBudget(budget)
+        # The event loop the budget lives on, for callers in other threads.
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.lanes = {
+            INFERENCE: Lane(
+                INFERENCE,
+                settings.ADMISSION_INFERENCE_CONCURRENCY,
+                settings.ADMISSION_INFERENCE_QUEUE,
+                settings.ADMISSION_INFERENCE_TARGET_MS / 1000,
+                cost=inference_cost,
+                priority=2,
+            ),
+            MATCH: Lane(
+                MATCH,
+                settings.ADMISSION_MATCH_CONCURRENCY,
+                settings.ADMISSION_MATCH_QUEUE,
+                settings.ADMISSION_MATCH_TARGET_MS / 1000,
+                cost=1,
+                priority=1,
+            ),
+            LIGHT: Lane(
+                LIGHT,
+                settings.ADMISSION_LIGHT_CONCURRENCY,
+                settings.ADMISSION_LIGHT_QUEUE,
+                settings.ADMISSION_LIGHT_TARGET_MS / 1000,
+                cost=0,
+                priority=0,
+            ),
+        }
+
+    def _shed(self, lane: Lane, reason: str) -> Shed:
+        lane.shed += 1
+        return Shed(lane.name, max(1.0, lane.estimated_wait()), reason)
+
+    async def admit(self, name: str) -> float:
+        """Wait for a slot (and CPU budget); returns the admission time. Raises Shed."""
+        self.loop = asyncio.get_running_loop()
+        lane = self.lanes[name]
+        sem = lane.sem()
+        if lane.queued >= lane.queue_limit and sem.locked():
+            raise self._shed(lane, "queue full")
+        if lane.estimated_wait() > lane.target_s:
+            raise self._shed(lane, "over latency target")
+
+        t0 = time.monotonic()
+        lane.queued += 1
+        try:
+            await asyncio.wait_for(sem.acquire(), timeout=lane.target_s)
+            if lane.cost:
+                remaining = lane.target_s - (time.monotonic() - t0)
+                try:
+                    await asyncio.wait_for(self.budget.acquire(lane.cost, lane.priority), timeout=max(remaining, 0.001))
+                except BaseException:
+                    sem.release()
+                    raise
+        except asyncio.TimeoutError:
+            raise self._shed(lane, "waited past latency target")
+        finally:
+            lane.queued -= 1
+
+        now = time.monotonic()
+        lane.queue_times.append(now - t0)
+        lane.in_flight += 1
+        lane.admitted += 1
+        return now
+
+    def release(self, name: str, admitted_at: float) -> None:
+        lane = self.lanes[name]
+        held = time.monotonic() - admitted_at
+        lane.service_s = held if lane.service_s == 0 else 0.8 * lane.service_s + 0.2 * held
+        lane.in_flight -= 1
+        if lane.cost:
+            self.budget.release(lane.cost)
+        lane.sem().release()
+
+    @contextlib.contextmanager
+    def background_cpu(self, cost: int) -> Iterator[None]:
+        """Hold `cost` of the CPU budget from a worker thread, waiting behind all requests.
+
+        Runs uncharged before the event loop has admitted anything, or with admission off.
+        """
+        loop = self.loop
+        if not settings.ADMISSION_ENABLED or loop is None or loop.is_closed():
+            yield
+            return
+        cost = min(cost, self.budget.total)
+        asyncio.run_coroutine_threadsafe(self.budget.acquire(cost, BACKGROUND_PRIORITY), loop).result()
+        try:
+            yield
+        finally:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self.budget.release, cost)
+
+    def stats(self) -> dict:
+        return {
+            "cpu_budget": {"total": self.budget.total, "used": self.budget.used, "waiting": self.budget.waiting},
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+        }
+
+
+controller = Controller()
+
+
+async def run(lane: str, fn: Callable[..., Any], *args: Any) -> Any:
+    """run_in_threadpool(fn, *args) inside a `lane` slot; a shed becomes 503 + Retry-After."""
+    if not settings.ADMISSION_ENABLED:
+        return await run_in_threadpool(fn, *args)
+    try:
+        admitted_at = await controller.admit(lane)
+    except Shed as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy ({e.reason})",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    try:
+        return await run_in_threadpool(fn, *args)
+    finally:
+        controller.release(lane, admitted_at)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware: holds the lane slot until the response has been sent."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        path, root = scope["path"], scope.get("root_path", "")
+        if root and path.startswith(root):
+            path = path[len(root):] or "/"
+        lane = classify(scope["method"], path)
+        if lane is None or admitted_in_handler(scope["method"], path):
+            await self.app(scope, receive, send)
+            return
+        try:
+            admitted_at = await controller.admit(lane)
+        except Shed as e:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": f"Server busy ({e.reason})", "lane": e.lane},
+                headers={"Retry-After": str(math.ceil(e.retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(lane, admitted_at)
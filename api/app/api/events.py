@@ -0,0 +1,86 @@
+# api/app/api/events.py
+"""Server-sent status events for dashboards.
+
+    GET /events/status?cursor=N   (or Last-Event-ID on reconnect)
+
+`event: status` messages carry small per-user deltas (`user`, `kind` and the
+changed fields such as `status`, `percent`, `doc_uploaded`). `event: reset`
+means the cursor is too old to replay and the client should reload
+/users/summary, which returns a fresh cursor.
+
+Replays start EVENTS_REPLAY_WINDOW ids below the cursor, because events can
+commit out of id order. Events already sent on this connection are not repeated,
+but a reconnecting client may get some again and should dedupe by id.
+"""
+import asyncio
+import json
+
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from ..config import settings
+from .. import events
+
+
+router = APIRouter()
+
+
+def _sse(ev: dict, name: str = "status") -> str:
+    return f"id: {ev['id']}\nevent: {name}\ndata: {json.dumps(ev)}\n\n"
+
+
+@router.get("/events/status")
+async def status_events(
+    request: Request,
+    cursor: int | None = Query(None, ge=0),
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
+):
+    if last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    await run_in_threadpool(events.hub.start)
+    # Subscribe before reading the backlog so nothing falls in between.
+    sub = events.hub.subscribe()
+    backlog: list[dict] | None = []
+    low = None
+    if cursor is not None:
+        low = max(cursor - settings.EVENTS_REPLAY_WINDOW, 0)
+        backlog = events.hub.since(low)
+        if backlog is None:
+            backlog = await run_in_threadpool(events.replay, low)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            if backlog is None:
+                yield _sse({"id": events.hub.last_id}, "reset")
+                sent: set[int] = set()
+            else:
+                for ev in backlog:
+                    yield _sse(ev)
+                sent = {ev["id"] for ev in backlog}
+            while True:
+                try:
+                    ev = await asyncio.wait_for(sub.queue.get(), timeout=settings.EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if ev is None:
+                    return  # fell behind; the client reconnects with its cursor
+                if ev["id"] in sent or (low is not None and ev["id"] <= low):
+                    continue
+                sent.add(ev["id"])
+                if len(sent) > 4 * settings.EVENTS_BUFFER:
+                    newest = max(sent)
+                    sent = {i for i in sent if i > newest - settings.EVENTS_BUFFER}
+                yield _sse(ev)
+        finally:
+            events.hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,11 +1,28 @@
-from fastapi import APIRouter, Depends, Query, UploadFile, File
+import asyncio
+import json
+from dataclasses import asdict
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 
-from ..db import get_db
+from ..config import settings
+from ..db import get_db, get_read_db, SessionLocal
 from .. import schemas
 from .. import functions
 from ..embedding import compute_face_embedding, compute_document_embedding
-from ..models import EmbeddingKind
+from ..models import EmbeddingKind, MediaKind
+from .. import media
+from .. import matching
+from .. import idempotency
+from .. import storage
+from .. import cache
+from .. import duplicates
+from .. import events
+from .. import admission
+from ..liveness_stream import LivenessStream
 
 
 router = APIRouter()
@@ -17,13 +34,12 @@ def create_session(payload: schemas.SessionCreate, db: Session = Depends(get_db)
 
 
 @router.get("/sessions/{session_id}", response_model=schemas.SessionDetailOut)
-def get_session(session_id: int, db: Session = Depends(get_db)):
-    s = functions.get_session(db, session_id)
-    # ensure relationships are loaded
-    _ = s.documents
-    _ = s.liveness
-    _ = s.result
-    return s
+def get_session(session_id: int, request: Request):
+    def build(db: Session):
+        s = functions.get_session(db, session_id)
+        return schemas.SessionDetailOut.model_validate(s, from_attributes=True)
+
+    return cache.respond(request, cache.session_scope(session_id), build)
 
 
 @router.post("/sessions/{session_id}/documents", response_model=schemas.DocumentOut)
@@ -48,30 +64,32 @@ def decide(session_id: int, payload: schemas.DecisionCreate, db: Session = Depen
 
 @router.get("/sessions", response_model=schemas.SessionListOut)
 def list_sessions(
+    request: Request,
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
 ):
-    items, total = functions.list_sessions(db, limit=limit, offset=offset)
-    return {"items": items, "total": total, "limit": limit, "offset": offset}
+    def build(db: Session):
+        items, total = functions.list_sessions(db, limit=limit, offset=offset)
+        return schemas.SessionListOut.model_validate(
+            {"items": items, "total": total, "limit": limit, "offset": offset}, from_attributes=True
+        )
+
+    return cache.respond(request, cache.ALL, build)
 
 
 @router.post("/sessions/{session_id}/face-image")
 async def upload_face_image(session_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    # Persist the image under data/faces and compute embedding if available
-    import os, time
-    from pathlib import Path
+    content = await file.read()
+    # Decode/inference block, so they run in the threadpool, never on the event loop.
+    return await admission.run(admission.INFERENCE, _upload_face_image, db, session_id, content)
+
 
+def _upload_face_image(db: Session, session_id: int, content: bytes) -> dict:
+    # Persist the image under data/faces and compute embedding if available
     # Ensure session exists
     _ = functions.get_session(db, session_id)
 
-    data_dir = Path("data/faces")
-    data_dir.mkdir(parents=True, exist_ok=True)
-    ts = int(time.time())
-    dest = data_dir / f"session_{session_id}_{ts}.jpg"
-    content = await file.read()
-    with open(dest, "wb") as f:
-        f.write(content)
+    dest = storage.write_upload("faces", f"session_{session_id}", "jpg", content)
 
     embedding = None
     message = None
@@ -79,96 +97,208 @@ async def upload_face_image(session_id: int, file: UploadFile = File(...), db: S
         embedding = compute_face_embedding(content)
     except Exception as e:
         message = f"Embedding not computed: {e}"
+    functions.record_media_asset(db, session_id, MediaKind.IMAGE, str(dest))
     if embedding is not None:
         functions.save_embedding(db, session_id, EmbeddingKind.FACE, embedding, str(dest))
     return {"ok": True, "file_key": str(dest), "embedding_dim": (len(embedding) if embedding else None), "message": message}
 
 
 # User-centric endpoints (no session_id in request)
+# Retries are deduplicated by Idempotency-Key header (or content digest) and the
+# blocking decode/inference runs in the threadpool, off the event loop.
 @router.post("/users/{external_user_id}/liveness-video")
-async def user_liveness_video(external_user_id: str, file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def user_liveness_video(
+    external_user_id: str,
+    response: Response,
+    file: UploadFile = File(...),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db),
+):
     """Ensure a session for user_id, store video, and compute FACE embedding."""
-    import time
-    from pathlib import Path
-    import subprocess
+    content = await file.read()
+    key = idempotency.request_key(f"users/{external_user_id}/liveness-video", content, idempotency_key)
+    return await idempotency.run_once(
+        db, key, storage.content_digest(content), response,
+        lambda: admission.run(admission.INFERENCE, _user_liveness_video, db, external_user_id, content),
+    )
+
+
+def _user_liveness_video(db: Session, external_user_id: str, content: bytes) -> dict:
+    dest = storage.write_upload("liveness", f"user_{external_user_id}", "webm", content)
+    return process_user_liveness_video(db, external_user_id, dest)
 
+
+def process_user_liveness_video(db: Session, external_user_id: str, dest: Path) -> dict:
+    """Embed a stored liveness video for the user's latest session and queue media processing."""
     s = functions.get_or_create_latest_session(db, external_user_id)
-    data_dir = Path("data/liveness")
-    data_dir.mkdir(parents=True, exist_ok=True)
-    ts = int(time.time())
-    dest = data_dir / f"user_{external_user_id}_{ts}.webm"
-    content = await file.read()
-    with open(dest, "wb") as f:
-        f.write(content)
+    functions.record_media_asset(db, s.id, MediaKind.VIDEO, str(dest))
     try:
-        from ..models import EmbeddingKind
-        frame_jpg = data_dir / f"user_{external_user_id}_{ts}.jpg"
-        subprocess.run([
-            "ffmpeg","-y","-i",str(dest),"-vf","thumbnail,scale=640:-1","-frames:v","1",str(frame_jpg)
-        ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if frame_jpg.exists():
-            data = frame_jpg.read_bytes()
-            emb = compute_face_embedding(data)
-            if emb:
-                functions.save_embedding(db, s.id, EmbeddingKind.FACE, emb, str(dest))
-                functions.set_liveness(db, s.id, str(dest))
-                return {"ok": True, "file_key": str(dest), "embedding_dim": len(emb)}
+        data = media.extract_frame(dest)
+        emb = compute_face_embedding(data)
+        if emb:
+            functions.save_embedding(db, s.id, EmbeddingKind.FACE, emb, str(dest))
+            functions.set_liveness(db, s.id, str(dest))
+            media.schedule_liveness_video(s.id, str(dest))
+            return {"ok": True, "file_key": str(dest), "embedding_dim": len(emb)}
     except Exception as e:
         return {"ok": False, "file_key": str(dest), "message": str(e)}
     return {"ok": False, "file_key": str(dest), "message": "No face detected"}
 
 
+def archive_user_liveness_video(db: Session, external_user_id: str, dest: Path) -> dict:
+    """Store a video whose liveness was already processed from the stream: archive only, no inference."""
+    s = functions.get_or_create_latest_session(db, external_user_id)
+    if s.liveness is None:
+        # Nothing was recorded from a stream; do the full processing instead.
+        return process_user_liveness_video(db, external_user_id, dest)
+    functions.record_media_asset(db, s.id, MediaKind.VIDEO, str(dest))
+    # The stream stored its best frame as video_key; the review link should open the video.
+    functions.attach_liveness_video(db, s.id, str(dest))
+    media.schedule_liveness_video(s.id, str(dest))
+    return {"ok": True, "file_key": str(dest), "archived": True}
+
+
+@router.websocket("/users/{external_user_id}/liveness-stream")
+async def user_liveness_stream(websocket: WebSocket, external_user_id: str):
+    """Stream JPEG frames (binary messages) while recording; send {"type": "end"} to finish.
+
+    Frames are embedded incrementally into a rolling aggregate, so the result is
+    ready shortly after the last frame. Replies with "progress" messages and a final "result".
+    """
+    await websocket.accept()
+    stream = LivenessStream()
+
+    async def progress(msg: dict):
+        try:
+            await websocket.send_json(msg)
+        except Exception:
+            pass
+
+    worker = asyncio.create_task(stream.run(progress))
+    try:
+        while True:
+            msg = await websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(msg.get("code", 1000))
+            if msg.get("bytes") is not None:
+                if not msg["bytes"]:
+                    await progress({"type": "error", "message": "Empty frame"})
+                    continue
+                if len(msg["bytes"]) > settings.LIVENESS_STREAM_MAX_FRAME_BYTES:
+                    await progress({"type": "error", "message": "Frame too large"})
+                    continue
+                stream.offer(msg["bytes"])
+            elif msg.get("text") is not None:
+                if _is_end_message(msg["text"]):
+                    break
+                await progress({"type": "error", "message": 'Expected {"type": "end"}'})
+        stream.close()
+        await worker
+    except WebSocketDisconnect:
+        return
+    finally:
+        # No-op once the worker has finished; stops it on disconnect or any error.
+        worker.cancel()
+
+    result = await run_in_threadpool(_finish_liveness_stream, external_user_id, stream)
+    await websocket.send_json({"type": "result", **result})
+    await websocket.close()
+
+
+def _is_end_message(text: str) -> bool:
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get("type") == "end"
+
+
+def _finish_liveness_stream(external_user_id: str, stream: LivenessStream) -> dict:
+    summary = stream.agg.summary()
+    vec = stream.agg.vector()
+    if vec is None or stream.agg.best_frame is None:
+        return {"ok": False, "message": "No face detected", **summary}
+    db = SessionLocal()
+    try:
+        s = functions.get_or_create_latest_session(db, external_user_id)
+        dest = storage.write_upload("liveness_frames", f"user_{external_user_id}", "jpg", stream.agg.best_frame)
+        functions.record_media_asset(db, s.id, MediaKind.IMAGE, str(dest))
+        functions.save_embedding(db, s.id, EmbeddingKind.FACE, vec, str(dest))
+        functions.set_liveness(db, s.id, str(dest))
+        return {"ok": True, "file_key": str(dest), "embedding_dim": len(vec), **summary}
+    finally:
+        db.close()
+
+
 @router.post("/users/{external_user_id}/document-image")
-async def user_document_image(external_user_id: str, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    import time
-    from pathlib import Path
+async def user_document_image(
+    external_user_id: str,
+    response: Response,
+    file: UploadFile = File(...),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db),
+):
+    content = await file.read()
+    key = idempotency.request_key(f"users/{external_user_id}/document-image", content, idempotency_key)
+    return await idempotency.run_once(
+        db, key, storage.content_digest(content), response,
+        lambda: admission.run(admission.INFERENCE, _user_document_image, db, external_user_id, content),
+    )
+
 
+def _user_document_image(db: Session, external_user_id: str, content: bytes) -> dict:
     s = functions.get_or_create_latest_session(db, external_user_id)
-    data_dir = Path("data/docs")
-    data_dir.mkdir(parents=True, exist_ok=True)
-    ts = int(time.time())
-    dest = data_dir / f"user_{external_user_id}_{ts}.jpg"
-    content = await file.read()
-    with open(dest, "wb") as f:
-        f.write(content)
+    dest = storage.write_upload("docs", f"user_{external_user_id}", "jpg", content)
+    functions.record_media_asset(db, s.id, MediaKind.IMAGE, str(dest))
+    dups = _document_duplicates(db, s.id, external_user_id, dest, content)
     try:
-        from ..models import EmbeddingKind
         emb = compute_face_embedding(content)
         if not emb:
-            return {"ok": False, "file_key": str(dest), "message": "No face detected on document"}
+            return {"ok": False, "file_key": str(dest), "message": "No face detected on document", "duplicates": dups}
         functions.save_embedding(db, s.id, EmbeddingKind.DOCUMENT, emb, str(dest))
-        return {"ok": True, "file_key": str(dest), "embedding_dim": len(emb)}
+        return {"ok": True, "file_key": str(dest), "embedding_dim": len(emb), "duplicates": dups}
     except Exception as e:
-        return {"ok": False, "file_key": str(dest), "message": str(e)}
+        return {"ok": False, "file_key": str(dest), "message": str(e), "duplicates": dups}
+
+
+def _document_duplicates(db: Session, session_id: int, external_user_id: str, dest: Path, content: bytes) -> list[dict]:
+    # Cheap pHash pass before the face pipeline; never fails the upload.
+    try:
+        return duplicates.check_document(db, session_id, external_user_id, str(dest), content)
+    except Exception:
+        db.rollback()
+        return []
 
 
 @router.post("/sessions/{session_id}/document-image")
 async def upload_document_image(session_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    # Require a face on the document image (front side)
-    import time
-    from pathlib import Path
-
-    _ = functions.get_session(db, session_id)
-    data_dir = Path("data/docs")
-    data_dir.mkdir(parents=True, exist_ok=True)
-    ts = int(time.time())
-    dest = data_dir / f"session_{session_id}_{ts}.jpg"
     content = await file.read()
-    with open(dest, "wb") as f:
-        f.write(content)
+    return await admission.run(admission.INFERENCE, _upload_document_image, db, session_id, content)
+
+
+def _upload_document_image(db: Session, session_id: int, content: bytes) -> dict:
+    # Require a face on the document image (front side)
+    s = functions.get_session(db, session_id)
+    dest = storage.write_upload("docs", f"session_{session_id}", "jpg", content)
+    functions.record_media_asset(db, session_id, MediaKind.IMAGE, str(dest))
+    dups = _document_duplicates(db, session_id, s.external_user_id, dest, content)
 
     try:
         embedding = compute_face_embedding(content)
         if not embedding:
-            return {"ok": False, "file_key": str(dest), "message": "No face detected on document"}
+            return {"ok": False, "file_key": str(dest), "message": "No face detected on document", "duplicates": dups}
         functions.save_embedding(db, session_id, EmbeddingKind.DOCUMENT, embedding, str(dest))
-        return {"ok": True, "file_key": str(dest), "embedding_dim": len(embedding)}
+        return {"ok": True, "file_key": str(dest), "embedding_dim": len(embedding), "duplicates": dups}
     except Exception as e:
-        return {"ok": False, "file_key": str(dest), "message": f"Embedding not computed: {e}"}
+        return {"ok": False, "file_key": str(dest), "message": f"Embedding not computed: {e}", "duplicates": dups}
 
 
 @router.get("/sessions/{session_id}/embeddings")
-def list_embeddings(session_id: int, db: Session = Depends(get_db)):
+def list_embeddings(session_id: int, request: Request):
+    return cache.respond(request, cache.session_scope(session_id), lambda db: _list_embeddings(db, session_id))
+
+
+def _list_embeddings(db: Session, session_id: int) -> list[dict]:
     from sqlalchemy import select, desc
     from ..models import Embedding
     rows = db.execute(select(Embedding).where(Embedding.session_id == session_id).order_by(desc(Embedding.id))).scalars().all()
@@ -179,6 +309,7 @@ def list_embeddings(session_id: int, db: Session = Depends(get_db)):
             "kind": r.kind.value,
             "file_key": r.file_key,
             "dim": r.dim,
+            "model_version": r.model_version or settings.EMBEDDING_LEGACY_VERSION,
             "created_at": r.created_at.isoformat(),
         }
         for r in rows
@@ -188,17 +319,14 @@ def list_embeddings(session_id: int, db: Session = Depends(get_db)):
 @router.post("/sessions/{session_id}/liveness-video")
 async def upload_liveness_video(session_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
     """Accept a recorded liveness video and store it; also update liveness metadata."""
-    import time
-    from pathlib import Path
-    import subprocess
-    _ = functions.get_session(db, session_id)
-    data_dir = Path("data/liveness")
-    data_dir.mkdir(parents=True, exist_ok=True)
-    ts = int(time.time())
-    dest = data_dir / f"session_{session_id}_{ts}.webm"
     content = await file.read()
-    with open(dest, "wb") as f:
-        f.write(content)
+    return await admission.run(admission.INFERENCE, _upload_liveness_video, db, session_id, content)
+
+
+def _upload_liveness_video(db: Session, session_id: int, content: bytes) -> dict:
+    _ = functions.get_session(db, session_id)
+    dest = storage.write_upload("liveness", f"session_{session_id}", "webm", content)
+    functions.record_media_asset(db, session_id, MediaKind.VIDEO, str(dest))
 
     # update liveness metadata to reference stored key and bump status
     try:
@@ -209,178 +337,159 @@ async def upload_liveness_video(session_id: int, file: UploadFile = File(...), d
     # Try to extract a representative frame and compute a FACE embedding
     embedding_dim = None
     try:
-        # Extract a representative frame to JPEG using ffmpeg's thumbnail filter
-        frame_jpg = data_dir / f"session_{session_id}_{ts}.jpg"
-        subprocess.run(
-            [
-                "ffmpeg",
-                "-y",
-                "-i",
-                str(dest),
-                "-vf",
-                "thumbnail,scale=640:-1",
-                "-frames:v",
-                "1",
-                str(frame_jpg),
-            ],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-
-        if frame_jpg.exists():
-            data = frame_jpg.read_bytes()
-            from ..embedding import compute_face_embedding
-            emb = compute_face_embedding(data)
-            if emb:
-                from ..models import EmbeddingKind
-                functions.save_embedding(db, session_id, EmbeddingKind.FACE, emb, str(dest))
-                embedding_dim = len(emb)
+        # Representative frame via ffmpeg's thumbnail filter, piped in memory
+        data = media.extract_frame(dest)
+        emb = compute_face_embedding(data)
+        if emb:
+            functions.save_embedding(db, session_id, EmbeddingKind.FACE, emb, str(dest))
+            embedding_dim = len(emb)
     except Exception:
         # Best-effort — keep upload ok even if embedding fails
         pass
 
+    # Transcode + thumbnails happen off the request path
+    media.schedule_liveness_video(session_id, str(dest))
+
     return {"ok": True, "file_key": str(dest), "embedding_dim": embedding_dim}
 
 
 @router.post("/sessions/{session_id}/match/compute")
-def compute_match(session_id: int, db: Session = Depends(get_db)):
-    """Compute cosine similarity between latest FACE and DOCUMENT embeddings for the session.
+def compute_match(
+    session_id: int,
+    aggregate: str | None = Query(None, pattern="^(max|mean|topk)$"),
+    k: int | None = Query(None, ge=1),
+    db: Session = Depends(get_db),
+):
+    """Score every FACE embedding against every DOCUMENT embedding of the session.
 
-    Saves the score into KycResult and returns the values.
+    Saves the aggregated score into KycResult and returns the values with the winning pair.
     """
-    from sqlalchemy import select, desc
-    from ..models import Embedding, EmbeddingKind
-    import json
-    import math
-
     _ = functions.get_session(db, session_id)
 
-    face = db.execute(
-        select(Embedding)
-        .where(Embedding.session_id == session_id, Embedding.kind == EmbeddingKind.FACE)
-        .order_by(desc(Embedding.id))
-        .limit(1)
-    ).scalar_one_or_none()
+    faces, docs = matching.session_embeddings(db, session_id)
+    return _match_and_save(db, session_id, faces, docs, aggregate, k)
 
-    doc = db.execute(
-        select(Embedding)
-        .where(Embedding.session_id == session_id, Embedding.kind == EmbeddingKind.DOCUMENT)
-        .order_by(desc(Embedding.id))
-        .limit(1)
-    ).scalar_one_or_none()
-
-    if not face or not doc:
-        return {"ok": False, "message": "Need both FACE and DOCUMENT embeddings"}
 
+def _match_and_save(db: Session, session_id: int | None, faces, docs, aggregate: str | None, k: int | None) -> dict:
+    """Shared by the session and user routes: score, store on `session_id`, report failures as ok=False."""
     try:
-        import numpy as np  # type: ignore
-        f = np.array(json.loads(face.vector_json), dtype=np.float32)
-        d = np.array(json.loads(doc.vector_json), dtype=np.float32)
-        # both are L2 normalized by construction, but normalize again for safety
-        def norm(x):
-            n = float(np.linalg.norm(x) + 1e-8)
-            return x / n
-        f = norm(f)
-        d = norm(d)
-        score = float(np.dot(f, d))  # cosine
-        percent = int(round(((score + 1.0) / 2.0) * 100))
-        functions.upsert_match_result(db, session_id, score, percent, "cosine-v1")
-        return {"ok": True, "score": score, "percent": percent}
+        m = matching.match_embeddings(faces, docs, aggregate, k)
+        if m is None:
+            return {"ok": False, "message": "Need both FACE and DOCUMENT embeddings"}
+        if session_id is not None:
+            functions.upsert_match_result(db, session_id, m.score, m.percent, matching.result_version(m))
+        return {"ok": True, **asdict(m)}
     except Exception as e:
+        db.rollback()
         return {"ok": False, "message": str(e)}
 
 
 @router.get("/users/summary")
-def users_summary(db: Session = Depends(get_db)):
+def users_summary(request: Request):
     """Return a list of user-level summaries with doc/kyc upload flags and latest percent."""
-    from sqlalchemy import select, func, desc
-    from ..models import KycSession, Embedding, EmbeddingKind, KycResult
+    return cache.respond(request, cache.ALL, _users_summary)
+
 
-    # All user ids
+def _users_summary(db: Session) -> dict:
+    from sqlalchemy import select, desc, func
+    from ..models import KycSession, Embedding, EmbeddingKind, KycResult, MediaAsset
+
+    # Read the cursor first: clients resume the event stream from here, and replaying
+    # an event already reflected below is harmless.
+    cursor = events.latest_cursor(db)
     users = [row[0] for row in db.execute(select(KycSession.external_user_id).distinct()).all()]
-    out = []
-    for uid in users:
-        # Any embeddings by kind for this user
-        has_doc = db.execute(
-            select(func.count())
-            .select_from(Embedding)
-            .join(KycSession, Embedding.session_id == KycSession.id)
-            .where(KycSession.external_user_id == uid, Embedding.kind == EmbeddingKind.DOCUMENT)
-        ).scalar_one() > 0
-        has_face = db.execute(
-            select(func.count())
-            .select_from(Embedding)
-            .join(KycSession, Embedding.session_id == KycSession.id)
-            .where(KycSession.external_user_id == uid, Embedding.kind == EmbeddingKind.FACE)
-        ).scalar_one() > 0
-
-        # Latest percent from any session's result
-        latest_percent = db.execute(
-            select(KycResult.match_percent)
-            .join(KycSession, KycResult.session_id == KycSession.id)
-            .where(KycSession.external_user_id == uid)
-            .order_by(desc(KycResult.updated_at))
-            .limit(1)
-        ).scalar_one_or_none()
-
-        out.append({
+    kinds: dict[str, set] = {}
+    for uid, kind in db.execute(
+        select(KycSession.external_user_id, Embedding.kind)
+        .join(Embedding, Embedding.session_id == KycSession.id)
+        .distinct()
+    ).all():
+        kinds.setdefault(uid, set()).add(kind)
+    # Latest percent from any session's result
+    percents: dict[str, float | None] = {}
+    for uid, percent in db.execute(
+        select(KycSession.external_user_id, KycResult.match_percent)
+        .join(KycResult, KycResult.session_id == KycSession.id)
+        .order_by(desc(KycResult.updated_at))
+    ).all():
+        percents.setdefault(uid, percent)
+    # Newest thumbnail asset id, so the table only requests images that exist (and can cache them by id).
+    thumbs: dict[str, int] = dict(
+        db.execute(
+            select(KycSession.external_user_id, func.max(MediaAsset.id))
+            .join(MediaAsset, MediaAsset.session_id == KycSession.id)
+            .where(MediaAsset.kind == MediaKind.THUMBNAIL)
+            .group_by(KycSession.external_user_id)
+        ).all()
+    )
+
+    out = [
+        {
             "external_user_id": uid,
-            "doc_uploaded": has_doc,
-            "kyc_uploaded": has_face,
-            "percent": latest_percent,
-        })
-    return {"items": out}
+            "doc_uploaded": EmbeddingKind.DOCUMENT in kinds.get(uid, ()),
+            "kyc_uploaded": EmbeddingKind.FACE in kinds.get(uid, ()),
+            "percent": percents.get(uid),
+            "thumbnail": thumbs.get(uid),
+        }
+        for uid in users
+    ]
+    return {"items": out, "cursor": cursor}
 
 
 @router.post("/users/{external_user_id}/match/compute")
-def user_compute_match(external_user_id: str, db: Session = Depends(get_db)):
-    """Compute cosine similarity between the latest FACE and DOCUMENT embeddings across all sessions for a user.
+def user_compute_match(
+    external_user_id: str,
+    aggregate: str | None = Query(None, pattern="^(max|mean|topk)$"),
+    k: int | None = Query(None, ge=1),
+    db: Session = Depends(get_db),
+):
+    """Score every FACE embedding against every DOCUMENT embedding across all sessions for a user.
 
-    Saves the score into the user's latest session KycResult and returns the values.
+    Saves the aggregated score into the user's latest session KycResult and returns the values.
     """
     from sqlalchemy import select, desc
-    from ..models import Embedding, EmbeddingKind, KycSession
-    import json
-    try:
-        import numpy as np  # type: ignore
-    except Exception as e:
-        return {"ok": False, "message": f"numpy not available: {e}"}
-
-    # Latest face/doc embeddings for this user
-    face = db.execute(
-        select(Embedding)
-        .join(KycSession, Embedding.session_id == KycSession.id)
-        .where(KycSession.external_user_id == external_user_id, Embedding.kind == EmbeddingKind.FACE)
-        .order_by(desc(Embedding.id))
-        .limit(1)
-    ).scalar_one_or_none()
-    doc = db.execute(
-        select(Embedding)
-        .join(KycSession, Embedding.session_id == KycSession.id)
-        .where(KycSession.external_user_id == external_user_id, Embedding.kind == EmbeddingKind.DOCUMENT)
-        .order_by(desc(Embedding.id))
-        .limit(1)
+    from ..models import KycSession
+
+    faces, docs = matching.user_embeddings(db, external_user_id)
+    # Save into latest session for this user
+    latest_id = db.execute(
+        select(KycSession.id).where(KycSession.external_user_id == external_user_id).order_by(desc(KycSession.id)).limit(1)
     ).scalar_one_or_none()
+    return _match_and_save(db, latest_id, faces, docs, aggregate, k)
 
-    if not face or not doc:
-        return {"ok": False, "message": "Need both FACE and DOCUMENT embeddings"}
 
-    f = np.array(json.loads(face.vector_json), dtype=np.float32)
-    d = np.array(json.loads(doc.vector_json), dtype=np.float32)
-    def norm(x):
-        n = float(np.linalg.norm(x) + 1e-8)
-        return x / n
-    f = norm(f)
-    d = norm(d)
-    score = float(np.dot(f, d))
-    percent = int(round(((score + 1.0) / 2.0) * 100))
+@router.get("/users/{external_user_id}/duplicates")
+def user_duplicates(external_user_id: str, db: Session = Depends(get_read_db)):
+    """Document images of this user that near-duplicate another user's (pHash)."""
+    return {"items": duplicates.user_duplicates(db, external_user_id)}
+
+
+@router.get("/users/{external_user_id}/storage")
+def user_storage(external_user_id: str, db: Session = Depends(get_read_db)):
+    """Per-user storage usage across uploads and derived media."""
+    return functions.user_storage_report(db, external_user_id)
+
+
+@router.get("/users/{external_user_id}/thumbnail")
+def user_thumbnail(
+    external_user_id: str,
+    v: int | None = Query(None, description="Thumbnail asset id from /users/summary"),
+    db: Session = Depends(get_read_db),
+):
+    resp = _media_file(db, external_user_id, MediaKind.THUMBNAIL)
+    if v is not None:
+        # A new thumbnail gets a new asset id, so a versioned URL never changes content.
+        resp.headers["Cache-Control"] = "private, max-age=86400, immutable"
+    return resp
+
+
+@router.get("/users/{external_user_id}/frame-strip")
+def user_frame_strip(external_user_id: str, db: Session = Depends(get_read_db)):
+    return _media_file(db, external_user_id, MediaKind.STRIP)
 
-    # Save into latest session for this user
-    latest_session = db.execute(
-        select(KycSession).where(KycSession.external_user_id == external_user_id).order_by(desc(KycSession.id)).limit(1)
-    ).scalar_one_or_none()
-    if latest_session:
-        functions.upsert_match_result(db, latest_session.id, score, percent, "cosine-v1")
 
-    return {"ok": True, "score": score, "percent": percent}
+def _media_file(db: Session, external_user_id: str, kind: MediaKind):
+    a = functions.latest_media_asset(db, external_user_id, kind)
+    if not a or not Path(a.file_key).exists():
+        raise HTTPException(status_code=404, detail="Media not found")
+    return FileResponse(a.file_key, media_type="image/jpeg")
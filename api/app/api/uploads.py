@@ -0,0 +1,281 @@
+# api/app/api/uploads.py
+"""Resumable liveness video uploads (tus-style).
+
+    POST   /users/{id}/liveness-video/uploads   Upload-Length: N       -> 201, Location
+    HEAD   /uploads/{upload_id}                                      -> Upload-Offset
+    PATCH  /uploads/{upload_id}   Upload-Offset: n, body = next bytes -> 204, Upload-Offset
+    POST   /uploads/{upload_id}/finalize[?archive_only=true]         -> same body as /liveness-video
+    DELETE /uploads/{upload_id}
+
+Each chunk is spooled to a file, then appended to the .part file in a short
+transaction; if a connection drops mid-chunk, the bytes that did arrive are kept
+and the client resumes from the reported offset.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import get_db
+from ..models import ResumableUpload, UploadState
+from .. import storage
+from .sessions import archive_user_liveness_video, process_user_liveness_video
+
+
+router = APIRouter()
+
+UPLOAD_DIR = storage.DATA_DIR / "uploads"
+TUS_VERSION = "1.0.0"
+
+
+def _headers(u: ResumableUpload) -> dict:
+    return {
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(u.offset),
+        "Upload-Length": str(u.length),
+        "Upload-Expires": u.expires_at.isoformat() + "Z",
+        "Cache-Control": "no-store",
+    }
+
+
+def _get_upload(db: Session, upload_id: str) -> ResumableUpload:
+    u = db.execute(select(ResumableUpload).where(ResumableUpload.id == upload_id)).scalar_one_or_none()
+    if not u or u.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    return u
+
+
+def _read_upload(db: Session, upload_id: str) -> ResumableUpload:
+    """Detached copy of the row; ends the transaction so no connection stays checked out."""
+    u = _get_upload(db, upload_id)
+    db.expunge(u)
+    db.rollback()
+    return u
+
+
+def _discard_files(u: ResumableUpload) -> None:
+    # part_key may already be the promoted file if a finalize failed after the rename.
+    (UPLOAD_DIR / f"{u.id}.part").unlink(missing_ok=True)
+    Path(u.part_key).unlink(missing_ok=True)
+
+
+def purge_expired_uploads(db: Session) -> int:
+    """Delete abandoned partial uploads (rows and .part files)."""
+    rows = db.execute(
+        select(ResumableUpload).where(ResumableUpload.expires_at < datetime.utcnow())
+    ).scalars().all()
+    for u in rows:
+        if u.state == UploadState.PENDING:
+            _discard_files(u)
+        db.delete(u)
+    db.commit()
+    return len(rows)
+
+
+@router.post("/users/{external_user_id}/liveness-video/uploads", status_code=201)
+def create_upload(
+    external_user_id: str,
+    response: Response,
+    upload_length: int = Header(..., alias="Upload-Length", ge=1),
+    db: Session = Depends(get_db),
+):
+    if upload_length > settings.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Upload too large")
+    purge_expired_uploads(db)
+
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    part = UPLOAD_DIR / f"{upload_id}.part"
+    part.touch()
+    u = ResumableUpload(
+        id=upload_id,
+        external_user_id=external_user_id,
+        kind="liveness-video",
+        length=upload_length,
+        offset=0,
+        part_key=str(part),
+        expires_at=datetime.utcnow() + timedelta(hours=settings.UPLOAD_EXPIRY_HOURS),
+    )
+    db.add(u)
+    db.commit()
+    response.headers.update(_headers(u))
+    response.headers["Location"] = f"/uploads/{upload_id}"
+    return {"upload_id": upload_id, "offset": 0, "length": upload_length}
+
+
+@router.head("/uploads/{upload_id}")
+def upload_offset(upload_id: str, db: Session = Depends(get_db)):
+    u = _get_upload(db, upload_id)
+    return Response(status_code=200, headers=_headers(u))
+
+
+@router.patch("/uploads/{upload_id}", status_code=204)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    db: Session = Depends(get_db),
+):
+    # No transaction or pooled connection is held while the body arrives: the
+    # chunk is spooled to its own file, then appended under a compare-and-swap
+    # on `offset`, so of two PATCHes for the same offset only one is applied.
+    u = await run_in_threadpool(_check_offset, db, upload_id, upload_offset)
+    length = u.length
+    spool = UPLOAD_DIR / f"{upload_id}.{uuid.uuid4().hex}.chunk"
+    written = 0
+    try:
+        with open(spool, "wb") as f:
+            async for chunk in request.stream():
+                if upload_offset + written + len(chunk) > length:
+                    raise HTTPException(status_code=413, detail="Chunk exceeds Upload-Length")
+                f.write(chunk)
+                written += len(chunk)
+    finally:
+        # Keep whatever arrived, even if the client disconnected mid-chunk.
+        try:
+            u = await asyncio.shield(run_in_threadpool(_append_chunk, db, upload_id, upload_offset, spool, written))
+        finally:
+            spool.unlink(missing_ok=True)
+    return Response(status_code=204, headers=_headers(u))
+
+
+def _check_offset(db: Session, upload_id: str, upload_offset: int) -> ResumableUpload:
+    u = _read_upload(db, upload_id)
+    if u.state != UploadState.PENDING:
+        raise HTTPException(status_code=409, detail="Upload already finalized")
+    if upload_offset != u.offset:
+        raise HTTPException(status_code=409, detail="Offset mismatch", headers=_headers(u))
+    return u
+
+
+def _append_chunk(db: Session, upload_id: str, start: int, spool: Path, written: int) -> ResumableUpload:
+    """Write the spooled bytes at `start` if the stored offset is still `start`."""
+    if written:
+        moved = db.execute(
+            update(ResumableUpload)
+            .where(
+                ResumableUpload.id == upload_id,
+                ResumableUpload.offset == start,
+                ResumableUpload.state == UploadState.PENDING,
+            )
+            .values(offset=start + written)
+        ).rowcount
+        if not moved:
+            db.rollback()
+            u = _read_upload(db, upload_id)
+            raise HTTPException(status_code=409, detail="Offset mismatch", headers=_headers(u))
+        # The row stays locked (briefly) until commit, so the file write is serialised too.
+        try:
+            u = _get_upload(db, upload_id)
+            with open(u.part_key, "r+b") as dst, open(spool, "rb") as src:
+                dst.seek(start)
+                shutil.copyfileobj(src, dst, 1 << 20)
+                dst.truncate(start + written)
+        except BaseException:
+            db.rollback()
+            raise
+        db.commit()
+    return _read_upload(db, upload_id)
+
+
+@router.post("/uploads/{upload_id}/finalize")
+def finalize_upload(
+    upload_id: str,
+    response: Response,
+    archive_only: bool = Query(False, description="Liveness was already processed from the stream; just archive"),
+    db: Session = Depends(get_db),
+):
+    """Hand a complete upload to the normal liveness embedding step. Safe to call again."""
+    u = _read_upload(db, upload_id)
+    if u.state == UploadState.COMPLETE and u.result_json is not None:
+        return json.loads(u.result_json)
+    if u.offset != u.length:
+        raise HTTPException(status_code=409, detail="Upload incomplete", headers=_headers(u))
+
+    # Claim the upload (compare-and-swap on state) before the slow steps, so a
+    # concurrent finalize backs off; no lock is held while they run. A claim
+    # older than UPLOAD_FINALIZE_TIMEOUT_SECONDS belonged to a worker that died
+    # mid-finalize and is taken over, like idempotency claims.
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.UPLOAD_FINALIZE_TIMEOUT_SECONDS)
+    claimed = db.execute(
+        update(ResumableUpload)
+        .where(
+            ResumableUpload.id == upload_id,
+            ResumableUpload.offset == ResumableUpload.length,
+            or_(
+                ResumableUpload.state == UploadState.PENDING,
+                and_(
+                    ResumableUpload.state == UploadState.COMPLETE,
+                    ResumableUpload.result_json.is_(None),
+                    or_(ResumableUpload.claimed_at.is_(None), ResumableUpload.claimed_at < stale),
+                ),
+            ),
+        )
+        .values(state=UploadState.COMPLETE, claimed_at=now)
+    ).rowcount
+    db.commit()
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Finalize in progress")
+
+    try:
+        u = _read_upload(db, upload_id)
+        dest = _promote(db, u)
+        process = archive_user_liveness_video if archive_only else process_user_liveness_video
+        result = process(db, u.external_user_id, dest)
+        u = _get_upload(db, upload_id)
+        u.result_json = json.dumps(result)
+        db.commit()
+    except BaseException:
+        # Hand the claim back so the client can simply call finalize again.
+        db.rollback()
+        db.execute(
+            update(ResumableUpload)
+            .where(ResumableUpload.id == upload_id, ResumableUpload.result_json.is_(None))
+            .values(state=UploadState.PENDING, claimed_at=None)
+        )
+        db.commit()
+        raise
+    response.headers["Tus-Resumable"] = TUS_VERSION
+    return result
+
+
+def _promote(db: Session, u: ResumableUpload) -> Path:
+    """Move the .part file to its final key; safe to repeat after a crash at any step.
+
+    The key is stored before the rename, so a retry finds the file at one of the two.
+    """
+    part = UPLOAD_DIR / f"{u.id}.part"
+    if u.part_key != str(part):
+        dest = Path(u.part_key)
+    else:
+        h = hashlib.sha256()
+        with open(part, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        dest = storage.new_file_key("liveness", f"user_{u.external_user_id}", "webm", h.hexdigest())
+        db.execute(update(ResumableUpload).where(ResumableUpload.id == u.id).values(part_key=str(dest)))
+        db.commit()
+    if part.exists():
+        os.replace(part, dest)
+    return dest
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+def cancel_upload(upload_id: str, db: Session = Depends(get_db)):
+    u = _get_upload(db, upload_id)
+    if u.state == UploadState.PENDING:
+        _discard_files(u)
+    db.delete(u)
+    db.commit()
+    return Response(status_code=204)
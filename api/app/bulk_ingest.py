@@ -0,0 +1,258 @@
+# api/app/bulk_ingest.py
+"""Offline bulk ingestion of existing KYC archives.
+
+    python -m app.bulk_ingest manifest.jsonl --workers 8 --batch 32
+
+The manifest is CSV (header: user_id,kind,path) or JSONL with the same keys.
+`kind` is `document`, `face` or `liveness` (a video; a representative frame is
+embedded). Images are decoded and embedded in a process pool with batched
+recognition, and document images get a pHash for duplicate detection.
+Sessions, hashes and embeddings are written in large transactions (COPY on
+Postgres). The resume point is committed in the same transaction,
+so after a crash the job restarts exactly where the last commit ended.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from . import cache
+from . import events
+from .db import SessionLocal, engine
+from .config import settings
+from .models import DocumentHash, Embedding, EmbeddingKind, IngestCheckpoint, KycSession, create_schema
+
+log = logging.getLogger("bulk_ingest")
+
+KINDS = {"document": EmbeddingKind.DOCUMENT, "face": EmbeddingKind.FACE, "liveness": EmbeddingKind.FACE}
+
+# (line_no, user_id, kind, path)
+Item = tuple[int, str, str, str]
+# (line_no, user_id, kind, path, vector or None, document pHash or None)
+# (line, user_id, kind, path, vector or None, signed pHash or None, file unreadable)
+Result = tuple[int, str, str, str, Optional[list[float]], Optional[int], bool]
+
+
+def read_manifest(path: Path, start: int = 0) -> Iterator[Item]:
+    """Yield manifest rows with their 0-based data line number, skipping those before `start`."""
+    with open(path, newline="") as f:
+        if path.suffix.lower() == ".csv":
+            rows: Iterator[dict] = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for n, row in enumerate(rows):
+            if n < start:
+                continue
+            kind = str(row["kind"]).strip().lower()
+            if kind not in KINDS:
+                raise ValueError(f"line {n}: unknown kind {kind!r}")
+            yield n, str(row["user_id"]).strip(), kind, str(row["path"]).strip()
+
+
+def _init_worker() -> None:
+    # One inference thread per process; the pool provides the parallelism.
+    settings.ORT_INTRA_OP_THREADS = 1
+    import cv2  # type: ignore
+    cv2.setNumThreads(1)
+    from .embedding import warmup
+    warmup()
+
+
+def _model_version() -> str:
+    from .embedding import face_model_version
+    return face_model_version()
+
+
+def _embed_batch(items: list[Item]) -> list[Result]:
+    from .embedding import compute_face_embeddings
+    from .media import extract_frame
+    from .phash import phash, to_signed
+
+    images: list[bytes] = []
+    for _, _, kind, path in items:
+        try:
+            images.append(extract_frame(path) if kind == "liveness" else Path(path).read_bytes())
+        except Exception:
+            images.append(b"")  # skipped by compute_face_embeddings, counted as failed
+    vectors = compute_face_embeddings(images)
+    hashes: list[Optional[int]] = []
+    for (_, _, kind, _), img in zip(items, images):
+        try:
+            hashes.append(to_signed(phash(img)) if kind == "document" and img else None)
+        except Exception:
+            hashes.append(None)
+    return [
+        (n, uid, kind, path, vec, h, not img)
+        for (n, uid, kind, path), vec, h, img in zip(items, vectors, hashes, images)
+    ]
+
+
+def _batches(items: Iterator[Item], size: int) -> Iterator[list[Item]]:
+    batch: list[Item] = []
+    for it in items:
+        batch.append(it)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _session_ids(db: Session, user_ids: set[str]) -> dict[str, int]:
+    """Latest session id per user, creating sessions for unknown users in one statement."""
+    existing = dict(
+        db.execute(
+            select(KycSession.external_user_id, KycSession.id).where(KycSession.external_user_id.in_(user_ids))
+        ).all()
+    )
+    missing = [u for u in user_ids if u not in existing]
+    if missing:
+        now = datetime.utcnow()
+        db.execute(
+            insert(KycSession),
+            [{"external_user_id": u, "created_at": now, "updated_at": now} for u in missing],
+        )
+        existing.update(
+            db.execute(
+                select(KycSession.external_user_id, KycSession.id).where(KycSession.external_user_id.in_(missing))
+            ).all()
+        )
+    return existing
+
+
+def _copy_embeddings(db: Session, rows: list[dict]) -> None:
+    if db.bind.dialect.name == "postgresql":
+        cols = ("session_id", "kind", "file_key", "dim", "vector_json", "model_version", "created_at")
+        raw = db.connection().connection
+        with raw.cursor() as cur:
+            with cur.copy(f"COPY embeddings ({', '.join(cols)}) FROM STDIN") as cp:
+                for r in rows:
+                    cp.write_row(tuple(r[c] for c in cols))
+    else:
+        db.execute(insert(Embedding), rows)
+
+
+def write_results(db: Session, job: str, results: list[Result], next_line: int, version: str) -> int:
+    """Insert sessions/embeddings for `results` and advance the checkpoint, in one transaction."""
+    for n, _, _, path, _, _, unreadable in results:
+        if unreadable:
+            log.warning("line %d: cannot read %s, skipped", n, path)
+    ok = [r for r in results if r[4] is not None]
+    hashed = [r for r in results if r[5] is not None]
+    sids = _session_ids(db, {r[1] for r in ok + hashed}) if ok or hashed else {}
+    now = datetime.utcnow()
+    if hashed:
+        db.execute(
+            insert(DocumentHash),
+            [{"session_id": sids[uid], "file_key": path, "phash": h, "created_at": now} for _, uid, _, path, _, h, _ in hashed],
+        )
+    if ok:
+        _copy_embeddings(db, [
+            {
+                "session_id": sids[uid],
+                "kind": KINDS[kind].value,
+                "file_key": path,
+                "dim": len(vec),
+                "vector_json": json.dumps(vec),
+                "model_version": version,
+                "created_at": now,
+            }
+            for _, uid, kind, path, vec, _, _ in ok
+        ])
+    ck = db.get(IngestCheckpoint, job) or IngestCheckpoint(job=job, next_line=0, processed=0, embedded=0)
+    ck.next_line = next_line
+    ck.processed = (ck.processed or 0) + len(results)
+    ck.embedded = (ck.embedded or 0) + len(ok)
+    db.add(ck)
+    if ok:
+        # Rows written with COPY bypass functions.py; tell dashboards to reload.
+        events.emit(db, "", "refresh")
+    db.commit()
+    if ok or hashed:
+        cache.touch_all()
+    return len(ok)
+
+
+def run(manifest: Path, job: str, workers: int, batch: int, commit_every: int) -> dict:
+    create_schema(engine)
+    db = SessionLocal()
+    ck = db.get(IngestCheckpoint, job)
+    start = ck.next_line if ck else 0
+    if start:
+        log.info("resuming %s at line %d", job, start)
+
+    t0 = time.perf_counter()
+    done = embedded = failed = 0
+    pending: list[Result] = []
+    window: deque[Future] = deque()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            # Label rows with the backend the workers actually loaded.
+            version = pool.submit(_model_version).result()
+            def drain_one() -> None:
+                nonlocal done, embedded, failed
+                # Results are consumed in submission order so the checkpoint is a simple watermark.
+                res = window.popleft().result()
+                failed += sum(1 for r in res if r[6])
+                pending.extend(res)
+                if len(pending) >= commit_every:
+                    embedded += write_results(db, job, pending, pending[-1][0] + 1, version)
+                    done += len(pending)
+                    pending.clear()
+                    rate = done / (time.perf_counter() - t0)
+                    log.info("%d images (%d embedded, %d failed), %.1f images/sec", done, embedded, failed, rate)
+
+            for b in _batches(read_manifest(manifest, start), batch):
+                window.append(pool.submit(_embed_batch, b))
+                if len(window) >= workers * 2:
+                    drain_one()
+            while window:
+                drain_one()
+            if pending:
+                embedded += write_results(db, job, pending, pending[-1][0] + 1, version)
+                done += len(pending)
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "job": job,
+        "processed": done,
+        "embedded": embedded,
+        "failed": failed,
+        "seconds": round(elapsed, 1),
+        "images_per_sec": round(done / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.bulk_ingest", description="Bulk-ingest a KYC archive manifest.")
+    ap.add_argument("manifest", type=Path, help="CSV or JSONL with user_id, kind, path")
+    ap.add_argument("--job", help="checkpoint name (default: absolute manifest path)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--batch", type=int, default=32, help="images per inference batch")
+    ap.add_argument("--commit-every", type=int, default=2000, help="rows per transaction")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    job = args.job or str(args.manifest.resolve())
+    summary = run(args.manifest, job, args.workers, args.batch, args.commit_every)
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+# api/app/cache.py
+"""Response cache for the polled review endpoints, with ETags.
+
+Each cached resource belongs to a scope with a version counter: `session:<id>`
+for one session, `all` for cross-session views (user summary, session list).
+The write functions in functions.py call `touch_session` after committing,
+which bumps both. The ETag is derived from the version alone, so an unchanged
+poll with If-None-Match gets a 304 without touching the database; a changed one
+is served from the body cache or rebuilt.
+
+Counters start from zero whenever a backend is created, so every ETag also
+carries the backend's epoch: random per process for `memory`, stored in the file
+for `shared`. A restarted or recycled worker therefore never re-issues an ETag
+for different data.
+
+Backends: `shared` (default; a SQLite file all workers and offline jobs on the
+host share; stand-in for Redis) and `memory` (per process; only correct with a
+single worker and no offline writers such as bulk_ingest or reembed).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from .config import settings
+
+ALL = "all"
+# Bumped by bulk writes that bypass functions.py; part of every ETag.
+GENERATION = "generation"
+
+
+def session_scope(session_id: int) -> str:
+    return f"session:{session_id}"
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int) -> None:
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._versions: dict[str, tuple[int, float]] = {}
+        self.max_entries = max_entries
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None or hit[1] < time.time():
+                return None
+            self._entries.move_to_end(key)
+            return hit[0]
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def versions(self, names: list[str]) -> dict[str, tuple[int, float]]:
+        with self._lock:
+            return {n: self._versions.get(n, (0, 0.0)) for n in names}
+
+    def bump(self, names: list[str]) -> None:
+        now = time.time()
+        with self._lock:
+            for n in names:
+                self._versions[n] = (self._versions.get(n, (0, 0.0))[0] + 1, now)
+
+
+class SharedBackend:
+    """SQLite (WAL) file shared by all processes on the host."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+            c.execute("CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, n INTEGER, bumped_at REAL)")
+            c.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            c.execute("INSERT OR IGNORE INTO meta VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],))
+            self.epoch = c.execute("SELECT value FROM meta WHERE name = 'epoch'").fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread and process (connections must not cross a fork).
+        c = getattr(self._local, "conn", None)
+        if c is None or self._local.pid != os.getpid():
+            c = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        now = time.time()
+        c = self._conn()
+        c.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, value, now + ttl))
+        if int(now) % 60 == 0:
+            c.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+
+    def versions(self, names: list[str]) -> dict[str, tuple[int, float]]:
+        rows = self._conn().execute(
+            f"SELECT name, n, bumped_at FROM versions WHERE name IN ({','.join('?' * len(names))})", names
+        ).fetchall()
+        found = {name: (n, at) for name, n, at in rows}
+        return {n: found.get(n, (0, 0.0)) for n in names}
+
+    def bump(self, names: list[str]) -> None:
+        now = time.time()
+        c = self._conn()
+        for n in names:
+            c.execute(
+                "INSERT INTO versions VALUES (?, 1, ?) "
+                "ON CONFLICT(name) DO UPDATE SET n = n + 1, bumped_at = excluded.bumped_at",
+                (n, now),
+            )
+
+
+_backend: MemoryBackend | SharedBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> MemoryBackend | SharedBackend | None:
+    global _backend
+    if settings.RESPONSE_CACHE_BACKEND == "off":
+        return None
+    with _backend_lock:
+        if _backend is None:
+            if settings.RESPONSE_CACHE_BACKEND == "shared":
+                _backend = SharedBackend(settings.RESPONSE_CACHE_PATH)
+            else:
+                _backend = MemoryBackend(settings.RESPONSE_CACHE_MAX_ENTRIES)
+        return _backend
+
+
+def touch_session(session_id: int) -> None:
+    """Invalidate cached views of one session (and the cross-session views)."""
+    backend = get_backend()
+    if backend is not None:
+        backend.bump([session_scope(session_id), ALL])
+
+
+def touch_all() -> None:
+    """Invalidate everything, e.g. after a bulk import (reaches API workers only with `shared`)."""
+    backend = get_backend()
+    if backend is not None:
+        backend.bump([GENERATION])
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in {t.strip() for t in header.split(",")}
+
+
+def respond(request: Request, scope: str, build: Callable[[Session], Any]) -> Response:
+    """Serve `build(db)` as JSON through the cache, honouring If-None-Match."""
+    from .db import open_read_session
+
+    backend = get_backend()
+    if backend is None:
+        db = open_read_session(request)
+        try:
+            return Response(json.dumps(jsonable_encoder(build(db))), media_type="application/json")
+        finally:
+            db.close()
+
+    v = backend.versions([GENERATION, scope])
+    (gen, gen_at), (n, n_at) = v[GENERATION], v[scope]
+    resource = f"{request.url.path}?{request.url.query}"
+    variant = hashlib.sha1(resource.encode()).hexdigest()[:8]
+    etag = f'W/"{variant}-{backend.epoch}-{gen}-{n}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    key = f"{resource}@{gen}-{n}"
+    body = backend.get(key)
+    if body is None:
+        # A replica may not have the write that bumped the version yet; read it from the primary.
+        fresh = time.time() - max(gen_at, n_at) < settings.DB_READ_STICKY_SECONDS
+        db = open_read_session(request, primary=fresh)
+        try:
+            body = json.dumps(jsonable_encoder(build(db))).encode()
+        finally:
+            db.close()
+        backend.set(key, body, settings.RESPONSE_CACHE_TTL_SECONDS)
+    return Response(body, media_type="application/json", headers=headers)
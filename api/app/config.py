@@ -7,7 +7,152 @@ class Settings(BaseSettings):
       default="postgresql+psycopg://kyc:kyc_password@db:5432/kyc",
       description="SQLAlchemy URL for Postgres",
   )
+  DATABASE_READ_URLS: str = Field(
+      default="",
+      description="Comma-separated SQLAlchemy URLs of read replicas; empty reads from the primary",
+  )
+  DB_POOL_SIZE: int = Field(default=5, ge=1, description="Persistent connections per engine per process")
+  DB_MAX_OVERFLOW: int = Field(default=10, ge=0, description="Extra connections allowed above DB_POOL_SIZE under load")
+  DB_POOL_TIMEOUT: int = Field(default=10, ge=1, description="Seconds to wait for a free connection before failing")
+  DB_POOL_RECYCLE: int = Field(default=1800, ge=-1, description="Reconnect connections older than this many seconds; -1 disables")
+  DB_STATEMENT_TIMEOUT_MS: int = Field(default=30_000, ge=0, description="Postgres statement_timeout on the primary; 0 disables")
+  DB_READ_STATEMENT_TIMEOUT_MS: int = Field(default=10_000, ge=0, description="Postgres statement_timeout on replicas; 0 disables")
+  DB_READ_STICKY_SECONDS: int = Field(
+      default=10,
+      ge=0,
+      description="After a client writes, its reads go to the primary for this long (read-your-writes)",
+  )
 
+  # Admission control (app/admission.py); limits are per API process
+  ADMISSION_ENABLED: bool = Field(default=True, description="Queue and shed requests per lane")
+  ADMISSION_CPU_BUDGET: int = Field(
+      default=0,
+      ge=0,
+      description="CPU threads inference + match may use at once; 0 = CPUs available to the process",
+  )
+  ADMISSION_INFERENCE_CONCURRENCY: int = Field(default=2, ge=1, description="Uploads running embedding at once")
+  ADMISSION_INFERENCE_QUEUE: int = Field(default=16, ge=0, description="Uploads allowed to wait")
+  ADMISSION_INFERENCE_TARGET_MS: int = Field(default=10_000, ge=1, description="Max queue wait before an upload is shed")
+  ADMISSION_MATCH_CONCURRENCY: int = Field(default=4, ge=1, description="Match computations at once")
+  ADMISSION_MATCH_QUEUE: int = Field(default=32, ge=0, description="Match computations allowed to wait")
+  ADMISSION_MATCH_TARGET_MS: int = Field(default=2_000, ge=1, description="Max queue wait before a match request is shed")
+  ADMISSION_LIGHT_CONCURRENCY: int = Field(default=32, ge=1, description="Reads/decisions at once")
+  ADMISSION_LIGHT_QUEUE: int = Field(default=256, ge=0, description="Reads/decisions allowed to wait")
+  ADMISSION_LIGHT_TARGET_MS: int = Field(default=250, ge=1, description="Max queue wait before a read/decision is shed")
 
-settings = Settings()
+  # Response cache for polled review endpoints
+  RESPONSE_CACHE_BACKEND: str = Field(
+      default="shared",
+      pattern="^(off|memory|shared)$",
+      description="shared (SQLite file shared by all workers and offline jobs on a host) | memory (one worker, no offline jobs) | off",
+  )
+  RESPONSE_CACHE_PATH: str = Field(default="data/cache/responses.sqlite3", description="File used by the shared backend")
+  RESPONSE_CACHE_TTL_SECONDS: int = Field(default=300, ge=1, description="How long a cached response body is kept")
+  RESPONSE_CACHE_MAX_ENTRIES: int = Field(default=1024, ge=1, description="Bodies kept by the memory backend")
+
+  # Background media pipeline (transcode / thumbnails for liveness videos)
+  MEDIA_WORKERS: int = Field(
+      default=1,
+      ge=0,
+      description="Concurrent media jobs per API process; 0 disables the pipeline",
+  )
+  MEDIA_NICE: int = Field(default=15, ge=0, le=19, description="nice(1) level for ffmpeg media jobs")
+  MEDIA_FFMPEG_THREADS: int = Field(default=1, ge=1, description="ffmpeg -threads for media jobs")
+  MEDIA_ARCHIVE_BITRATE: str = Field(default="200k", description="Target video bitrate for archived liveness clips")
+  MEDIA_ARCHIVE_HEIGHT: int = Field(default=480, ge=120, description="Max frame height for archived liveness clips")
+  MEDIA_ARCHIVE_MAX_BYTES: int = Field(default=2_000_000, ge=100_000, description="Size cap for an archived clip; long clips get a lower bitrate to fit")
+  MEDIA_KEEP_ORIGINAL: bool = Field(default=False, description="Keep the raw upload after a successful transcode")
+  MEDIA_STRIP_FRAMES: int = Field(default=6, ge=1, le=20, description="Frames in the review frame strip")
+
+  # Production server profile (gunicorn.conf.py)
+  WEB_WORKERS: int = Field(default=0, ge=0, description="gunicorn worker processes; 0 means one per available CPU")
+  WEB_BIND: str = Field(default="0.0.0.0:8000", description="gunicorn bind address")
+  ORT_INTRA_OP_THREADS: int = Field(default=1, ge=1, description="onnxruntime intra-op threads per worker")
+  ORT_INTER_OP_THREADS: int = Field(default=1, ge=1, description="onnxruntime inter-op threads per worker")
+  PRELOAD_MODELS: bool = Field(
+      default=True,
+      description="Load embedding models in the gunicorn master so workers share weights copy-on-write",
+  )
+  CPU_PINNING: bool = Field(default=False, description="Pin each worker to its own slice of CPUs")
+  WORKER_MAX_REQUESTS: int = Field(default=2000, ge=0, description="Recycle a worker after N requests; 0 disables")
+  WORKER_MAX_REQUESTS_JITTER: int = Field(default=200, ge=0, description="Random jitter so workers do not recycle together")
+  WORKER_GRACEFUL_TIMEOUT: int = Field(default=30, ge=1, description="Seconds to drain in-flight requests on shutdown/recycle")
+  WORKER_TIMEOUT: int = Field(default=120, ge=1, description="Kill a worker that is silent for this many seconds")
+
+  # Face/document match engine (app/matching.py)
+  MATCH_AGGREGATE: str = Field(
+      default="max",
+      pattern="^(max|mean|topk)$",
+      description="How FACE x DOCUMENT pair scores are reduced to one score",
+  )
+  MATCH_TOP_K: int = Field(default=3, ge=1, description="Pairs averaged when MATCH_AGGREGATE=topk")
+  MATCH_CALIBRATION: str = Field(
+      default="-1:0,1:100",
+      description="Piecewise-linear cosine->percent curve as 'score:percent' points, e.g. '0.1:20,0.3:60,0.5:95'",
+  )
+
+  # Embedding model versions (app/reembed.py)
+  FACE_MODEL_PACK: str = Field(default="buffalo_l", description="InsightFace model pack used for face embeddings")
+  EMBEDDING_MODEL_VERSION: str = Field(
+      default="buffalo_l",
+      max_length=100,
+      description="Label written on new embeddings; change it together with FACE_MODEL_PACK",
+  )
+  EMBEDDING_LEGACY_VERSION: str = Field(
+      default="buffalo_l",
+      description="Version assumed for embeddings stored before versions were recorded",
+  )
+
+  # Push status updates (app/events.py)
+  EVENTS_CHANNEL: str = Field(default="kyc_status", pattern="^[a-z_][a-z0-9_]*$", description="Postgres NOTIFY channel")
+  EVENTS_BUFFER: int = Field(default=2000, ge=100, description="Recent events kept in memory per process for resuming streams")
+  EVENTS_REPLAY_WINDOW: int = Field(
+      default=200,
+      ge=0,
+      description="Ids below a cursor that are re-sent on (re)connect, for events committed out of id order",
+  )
+  EVENTS_HEARTBEAT_SECONDS: int = Field(default=15, ge=1, description="Keep-alive comment interval on idle event streams")
+  EVENTS_RETENTION_HOURS: int = Field(default=24, ge=1, description="Stored events older than this are purged; older cursors get a reset")
+
+  # Upload idempotency (app/idempotency.py)
+  IDEMPOTENCY_TTL_HOURS: int = Field(default=24, ge=1, description="How long a completed upload can be replayed")
+  IDEMPOTENCY_PENDING_TIMEOUT_SECONDS: int = Field(
+      default=300,
+      ge=1,
+      description="A claim not completed within this long is presumed dead and may be taken over",
+  )
+
+  # Resumable (chunked) uploads (app/api/uploads.py)
+  UPLOAD_MAX_BYTES: int = Field(default=200_000_000, ge=1, description="Largest resumable upload accepted")
+  UPLOAD_EXPIRY_HOURS: int = Field(default=24, ge=1, description="Abandoned partial uploads are deleted after this")
+  UPLOAD_FINALIZE_TIMEOUT_SECONDS: int = Field(
+      default=600,
+      ge=1,
+      description="A finalize not finished within this long is presumed dead and may be claimed again",
+  )
 
+  # Duplicate document detection (app/phash.py, app/duplicates.py)
+  PHASH_MAX_DISTANCE: int = Field(default=6, ge=0, le=16, description="Hamming distance treated as a near-duplicate")
+  PHASH_CLIP_CONFIRM: bool = Field(
+      default=False,
+      description="Re-check pHash hits with CLIP document embeddings before reporting them",
+  )
+  PHASH_CLIP_MIN_SIMILARITY: float = Field(default=0.92, description="CLIP cosine needed to confirm a pHash hit")
+  PHASH_SYNC_TRAIL_IDS: int = Field(
+      default=5000,
+      ge=0,
+      description="Re-scan this many ids below the index watermark on each sync, for rows committed out of id order",
+  )
+
+  # Streaming liveness over WebSocket (app/liveness_stream.py)
+  LIVENESS_STREAM_CPU_SHARE: float = Field(
+      default=0.5, gt=0, description="CPU seconds per wall second one stream may spend on inference"
+  )
+  LIVENESS_STREAM_BURST_SECONDS: float = Field(default=1.0, ge=0, description="CPU a stream may spend up front")
+  LIVENESS_STREAM_MAX_EMBEDDINGS: int = Field(default=8, ge=1, description="Stop embedding once this many frames are in the aggregate")
+  LIVENESS_STREAM_MIN_SHARPNESS: float = Field(default=40.0, ge=0, description="Laplacian variance below which a frame is skipped as blurry")
+  LIVENESS_STREAM_MAX_INFLIGHT: int = Field(default=2, ge=1, description="Frames processed at once across all streams in a process")
+  LIVENESS_STREAM_MAX_FRAME_BYTES: int = Field(default=500_000, ge=1, description="Largest accepted frame message")
+
+
+settings = Settings()
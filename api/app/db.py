@@ -1,19 +1,160 @@
 # api/app/db.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+"""Engines and sessions.
+
+Writes always go to the primary (`SessionLocal` / `get_db`). Read-only endpoints
+use `get_read_db`, which picks a replica from DATABASE_READ_URLS round-robin,
+unless the client wrote recently (see `mark_write`), in which case it reads from
+the primary so the user sees their own upload despite replication lag.
+"""
+import itertools
+import threading
+import time
+
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 from .config import settings
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+STICKY_COOKIE = "kyc_read_primary_until"
+
+# Pool saturation metrics
+_pool_counters: dict[int, dict] = {}
+_counter_lock = threading.Lock()
+
+
+def _track_pool(eng: Engine) -> None:
+    c = _pool_counters.setdefault(id(eng), {"checkouts": 0, "peak_checked_out": 0, "timeouts": 0})
+
+    @event.listens_for(eng, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        with _counter_lock:
+            c["checkouts"] += 1
+            out = eng.pool.checkedout() if hasattr(eng.pool, "checkedout") else 0
+            c["peak_checked_out"] = max(c["peak_checked_out"], out)
+
+
+def _make_engine(url: str, statement_timeout_ms: int) -> Engine:
+    connect_args = {}
+    if url.startswith("postgresql") and statement_timeout_ms:
+        connect_args["options"] = f"-c statement_timeout={statement_timeout_ms}"
+    pool_args = {}
+    if not url.startswith("sqlite"):
+        pool_args = dict(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    eng = create_engine(url, pool_pre_ping=True, connect_args=connect_args, **pool_args)
+    _track_pool(eng)
+    return eng
+
+
+engine = _make_engine(settings.DATABASE_URL, settings.DB_STATEMENT_TIMEOUT_MS)
+read_engines = [
+    _make_engine(url.strip(), settings.DB_READ_STATEMENT_TIMEOUT_MS)
+    for url in settings.DATABASE_READ_URLS.split(",")
+    if url.strip()
+] if settings.DATABASE_READ_URLS else []
+
+class _PoolSession(Session):
+    """Session that counts pool timeouts, however it was opened (get_db, open_read_session, jobs)."""
+
+    def _connection_for_bind(self, engine, execution_options=None, **kw):
+        try:
+            return super()._connection_for_bind(engine, execution_options, **kw)
+        except exc.TimeoutError:
+            # Gave up waiting for a pooled connection.
+            with _counter_lock:
+                c = _pool_counters.get(id(engine))
+                if c is not None:
+                    c["timeouts"] += 1
+            raise
+
+
+SessionLocal = sessionmaker(bind=engine, class_=_PoolSession, autoflush=False, autocommit=False)
+_read_sessions = [sessionmaker(bind=e, class_=_PoolSession, autoflush=False, autocommit=False) for e in read_engines]
+_next_replica = itertools.cycle(range(len(_read_sessions))) if _read_sessions else None
+_next_lock = threading.Lock()
 
 
 class Base(DeclarativeBase):
     pass
 
 
-def get_db():
-    db = SessionLocal()
+def _session_scope(factory: sessionmaker):
+    db = factory()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_db():
+    yield from _session_scope(SessionLocal)
+
+
+def _read_from_primary(request: Request) -> bool:
+    if not _read_sessions:
+        return True
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _read_factory(request: Request, primary: bool = False) -> sessionmaker:
+    if primary or _read_from_primary(request):
+        return SessionLocal
+    with _next_lock:
+        i = next(_next_replica)
+    return _read_sessions[i]
+
+
+def get_read_db(request: Request):
+    """Session for read-only endpoints: a replica, or the primary right after this client wrote."""
+    yield from _session_scope(_read_factory(request))
+
+
+def open_read_session(request: Request, primary: bool = False) -> Session:
+    """Like get_read_db, for code that opens the session itself; `primary` forces the primary."""
+    return _read_factory(request, primary)()
+
+
+def mark_write(response: Response) -> None:
+    """Pin this client's reads to the primary for DB_READ_STICKY_SECONDS."""
+    if read_engines and settings.DB_READ_STICKY_SECONDS:
+        until = time.time() + settings.DB_READ_STICKY_SECONDS
+        response.set_cookie(
+            STICKY_COOKIE,
+            f"{until:.0f}",
+            max_age=settings.DB_READ_STICKY_SECONDS,
+            httponly=True,
+            samesite="lax",
+        )
+
+
+def dispose_engines(close: bool = True) -> None:
+    for e in [engine, *read_engines]:
+        e.dispose(close=close)
+
+
+def pool_stats() -> list[dict]:
+    out = []
+    for role, eng in [("primary", engine), *(("replica", e) for e in read_engines)]:
+        pool = eng.pool
+        item = {"role": role, "url": eng.url.render_as_string(hide_password=True)}
+        if hasattr(pool, "checkedout"):
+            capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+            item.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+                capacity=capacity,
+                saturation=round(pool.checkedout() / capacity, 3) if capacity else None,
+            )
+        item.update(_pool_counters.get(id(eng), {}))
+        out.append(item)
+    return out
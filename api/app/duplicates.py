@@ -0,0 +1,118 @@
+# api/app/duplicates.py
+"""First-pass fraud check: the same document photo reused across users.
+
+Every document image gets a pHash at upload; near-duplicates belonging to other
+users are looked up in the in-memory HashIndex. The index is loaded once at
+startup. Before each check a process loads the rows above its sync watermark,
+plus a trailing window of PHASH_SYNC_TRAIL_IDS ids below it: ids are assigned at
+insert but become visible at commit, so a lower id can show up late. Hashes
+written by other workers or by bulk ingestion are picked up on the next check.
+"""
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+
+import numpy as np  # type: ignore
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import DocumentHash, KycSession
+from . import functions
+from . import phash
+
+_sync_lock = threading.Lock()
+
+
+def sync_index(db: Session) -> phash.HashIndex:
+    """Load rows this process has not indexed yet; the first call loads everything."""
+    index = phash.get_index()
+    trail = settings.PHASH_SYNC_TRAIL_IDS
+    with _sync_lock:
+        after = max(index.synced_id - trail, 0)
+        pages: list[np.ndarray] = []
+        while True:
+            rows = functions.document_hashes_after(db, after)
+            if not rows:
+                break
+            page = np.array(rows, dtype=np.int64)  # id, session_id, signed phash
+            pages.append(page)
+            after = int(page[-1, 0])
+        if pages:
+            # One merge for all pages: a cold load of N rows is a single sort, not one per page.
+            data = np.concatenate(pages)
+            index.extend(data[:, 2].astype(np.uint64), data[:, 0], data[:, 1], trail)
+    return index
+
+
+def warm_index() -> int:
+    """Load the index before serving (in the gunicorn master, so workers share it)."""
+    from .db import SessionLocal
+    db = SessionLocal()
+    try:
+        return len(sync_index(db))
+    finally:
+        db.close()
+
+
+def _clip_similarity(a: bytes, b_key: str) -> float | None:
+    from .embedding import compute_document_embedding
+    p = Path(b_key)
+    if not p.exists():
+        return None
+    va = np.asarray(compute_document_embedding(a), dtype=np.float32)
+    vb = np.asarray(compute_document_embedding(p.read_bytes()), dtype=np.float32)
+    return float(np.dot(va, vb))
+
+
+def _describe(db: Session, external_user_id: str, matches: list[phash.HashMatch], content: bytes | None) -> list[dict]:
+    if not matches:
+        return []
+    rows = {
+        r.id: r
+        for r in db.execute(select(DocumentHash).where(DocumentHash.id.in_([m.row_id for m in matches]))).scalars()
+    }
+    users = dict(
+        db.execute(
+            select(KycSession.id, KycSession.external_user_id).where(KycSession.id.in_({m.session_id for m in matches}))
+        ).all()
+    )
+    out = []
+    for m in matches:
+        uid = users.get(m.session_id)
+        row = rows.get(m.row_id)
+        if uid is None or row is None or uid == external_user_id:
+            continue
+        item = {"external_user_id": uid, "file_key": row.file_key, "distance": m.distance}
+        if content is not None and settings.PHASH_CLIP_CONFIRM:
+            sim = _clip_similarity(content, row.file_key)
+            if sim is not None and sim < settings.PHASH_CLIP_MIN_SIMILARITY:
+                continue
+            item["clip_similarity"] = sim
+        out.append(item)
+    return out
+
+
+def check_document(db: Session, session_id: int, external_user_id: str, file_key: str, content: bytes) -> list[dict]:
+    """Hash and index a new document image; return near-duplicates owned by other users."""
+    h = phash.phash(content)
+    index = sync_index(db)
+    matches = index.query(h, settings.PHASH_MAX_DISTANCE)
+    row = functions.save_document_hash(db, session_id, file_key, phash.to_signed(h))
+    index.add(h, row.id, session_id)
+    return _describe(db, external_user_id, matches, content)
+
+
+def user_duplicates(db: Session, external_user_id: str) -> list[dict]:
+    index = sync_index(db)
+    own = db.execute(
+        select(DocumentHash)
+        .join(KycSession, DocumentHash.session_id == KycSession.id)
+        .where(KycSession.external_user_id == external_user_id)
+    ).scalars().all()
+    out = []
+    for d in own:
+        hits = _describe(db, external_user_id, index.query(phash.to_unsigned(d.phash), settings.PHASH_MAX_DISTANCE), None)
+        out.extend({"file_key": d.file_key, "duplicate": hit} for hit in hits)
+    return out
@@ -8,6 +8,8 @@ import numpy as np  # type: ignore
 import onnxruntime as ort  # type: ignore
 import cv2  # type: ignore
 
+from .config import settings
+
 
 _face_sess: Optional[ort.InferenceSession] = None
 _clip_sess: Optional[ort.InferenceSession] = None
@@ -22,6 +24,8 @@ def _lazy_init():
     sess_opts = ort.SessionOptions()
     sess_opts.enable_mem_pattern = False
     sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    sess_opts.intra_op_num_threads = settings.ORT_INTRA_OP_THREADS
+    sess_opts.inter_op_num_threads = settings.ORT_INTER_OP_THREADS
 
     if _face_sess is None and face_model.exists():
         _face_sess = ort.InferenceSession(str(face_model), sess_options=sess_opts, providers=["CPUExecutionProvider"])
@@ -32,13 +36,36 @@ def _lazy_init():
     if _insight_app is None:
         try:
             from insightface.app import FaceAnalysis  # type: ignore
-            app = FaceAnalysis(name="buffalo_l")
+            app = FaceAnalysis(name=settings.FACE_MODEL_PACK, sess_options=sess_opts, providers=["CPUExecutionProvider"])
             app.prepare(ctx_id=0, det_size=(640, 640))
             _insight_app = app
         except Exception:
             _insight_app = None
 
 
+# model_version for vectors from models/face.onnx, used when InsightFace cannot load.
+ONNX_FACE_MODEL_VERSION = "face.onnx"
+
+
+def face_model_version() -> str:
+    """model_version of the face vectors this process computes.
+
+    EMBEDDING_MODEL_VERSION labels the InsightFace pack (FACE_MODEL_PACK); the
+    ONNX fallback produces different vectors and gets its own label.
+    """
+    _lazy_init()
+    if _insight_app is not None:
+        return settings.EMBEDDING_MODEL_VERSION
+    if _face_sess is None:
+        raise RuntimeError("Face model not available (InsightFace/ONNX)")
+    return ONNX_FACE_MODEL_VERSION
+
+
+def warmup() -> None:
+    """Load models eagerly (e.g. in the gunicorn master before workers fork)."""
+    _lazy_init()
+
+
 def _imdecode_rgb(image_bytes: bytes) -> np.ndarray:
     arr = np.frombuffer(image_bytes, dtype=np.uint8)
     bgr = cv2.imdecode(arr, cv2.IMREAD_COLOR)
@@ -140,3 +167,70 @@ def compute_document_embedding(image_bytes: bytes) -> List[float]:
     norm = np.linalg.norm(vec) + 1e-8
     vec = vec / norm
     return vec.tolist()
+
+
+def compute_face_embeddings(images: List[bytes]) -> List[Optional[List[float]]]:
+    """Batched variant of compute_face_embedding for offline jobs.
+
+    Detection runs per image; recognition runs once over all detected faces.
+    Returns one entry per input, None where the image is empty, could not be decoded or has no face.
+    Vectors are identical to those from compute_face_embedding.
+    """
+    _lazy_init()
+    out: List[Optional[List[float]]] = [None] * len(images)
+    crops: list[np.ndarray] = []
+    idx: list[int] = []
+
+    if _insight_app is not None:
+        from insightface.utils import face_align  # type: ignore
+        rec = _insight_app.models["recognition"]
+        for i, b in enumerate(images):
+            if not b:
+                continue
+            # One undecodable or degenerate image must not fail the whole batch.
+            try:
+                rgb = _imdecode_rgb(b)
+                _, kpss = _insight_app.det_model.detect(rgb, max_num=0, metric="default")
+                if kpss is None or len(kpss) == 0:
+                    continue
+                crops.append(face_align.norm_crop(rgb, landmark=kpss[0], image_size=rec.input_size[0]))
+            except (RuntimeError, cv2.error):
+                continue
+            idx.append(i)
+        if crops:
+            feats = np.asarray(rec.get_feat(crops), dtype=np.float32).reshape(len(crops), -1)
+            feats = feats / (np.linalg.norm(feats, axis=1, keepdims=True) + 1e-8)
+            for i, v in zip(idx, feats):
+                out[i] = v.tolist()
+        return out
+
+    if _face_sess is None:
+        raise RuntimeError("Face model not available (InsightFace/ONNX)")
+    for i, b in enumerate(images):
+        if not b:
+            continue
+        try:
+            rgb = _imdecode_rgb(b)
+            bbox = _detect_face_bbox(rgb)
+            if not bbox:
+                continue
+            x, y, w, h = bbox
+            inp = cv2.resize(rgb[y:y + h, x:x + w], (112, 112), interpolation=cv2.INTER_AREA)
+        except (RuntimeError, cv2.error):
+            continue
+        crops.append(np.transpose(_normalize(inp, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5)), (2, 0, 1)))
+        idx.append(i)
+    if not crops:
+        return out
+    inp_meta = _face_sess.get_inputs()[0]
+    batch = np.stack(crops).astype(np.float32)
+    if isinstance(inp_meta.shape[0], int):
+        # Fixed batch dimension: run one image at a time
+        feats = np.concatenate([_face_sess.run(None, {inp_meta.name: batch[j:j + 1]})[0] for j in range(len(batch))])
+    else:
+        feats = _face_sess.run(None, {inp_meta.name: batch})[0]
+    feats = feats.reshape(len(crops), -1).astype(np.float32)
+    feats = feats / (np.linalg.norm(feats, axis=1, keepdims=True) + 1e-8)
+    for i, v in zip(idx, feats):
+        out[i] = v.tolist()
+    return out
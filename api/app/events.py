@@ -0,0 +1,230 @@
+# api/app/events.py
+"""Push status updates to dashboards instead of having them poll.
+
+Write paths in functions.py call `emit` before committing. It stores a
+StatusEvent row, whose id is the stream cursor. On Postgres it also issues
+pg_notify in the same transaction, so the notification goes out only if the
+write commits. Each API process holds one LISTEN connection, opened with its
+first subscriber, and fans events out to its SSE clients from memory.
+
+A reconnecting client sends its last id. It is replayed from the in-memory
+buffer, or from the table when it is further behind. Connected dashboards cost
+no queries, however many there are.
+
+Ids are assigned at insert, not at commit, so an event can become visible after
+one with a higher id. Nothing is filtered by "id <= cursor" alone: the buffer
+accepts late events, and replays start EVENTS_REPLAY_WINDOW ids below the
+cursor. Clients dedupe by id.
+
+Without Postgres (local SQLite), events are published in-process after commit.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import KycSession, StatusEvent
+
+log = logging.getLogger("events")
+
+_PENDING = "pending_status_events"
+
+
+def emit(db: Session, external_user_id: str, kind: str, **fields) -> None:
+    """Record a status event in the current transaction; delivered on commit."""
+    payload = {"user": external_user_id, "kind": kind, **fields}
+    ev = StatusEvent(external_user_id=external_user_id, kind=kind, payload_json=json.dumps(payload))
+    db.add(ev)
+    db.flush()
+    msg = {"id": ev.id, **payload}
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_notify(settings.EVENTS_CHANNEL, json.dumps(msg))))
+    else:
+        db.info.setdefault(_PENDING, []).append(msg)
+
+
+def emit_for_session(db: Session, session_id: int, kind: str, **fields) -> None:
+    s = db.get(KycSession, session_id)
+    if s is not None:
+        emit(db, s.external_user_id, kind, status=s.status.value, **fields)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_local(db: Session) -> None:
+    for msg in db.info.pop(_PENDING, []):
+        hub.publish(msg)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_local(db: Session) -> None:
+    db.info.pop(_PENDING, None)
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.queue: asyncio.Queue[Optional[dict]] = asyncio.Queue(maxsize=1000)
+        self.overflowed = False
+
+    def _put(self, ev: Optional[dict]) -> None:
+        if self.overflowed:
+            return
+        if self.queue.full():
+            # Too slow to keep up: end the stream (None), the client resumes from its cursor.
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            ev = None
+        self.queue.put_nowait(ev)
+
+    def push(self, ev: dict) -> None:
+        self.loop.call_soon_threadsafe(self._put, ev)
+
+
+class Hub:
+    """Recent events of this process and its live subscribers."""
+
+    def __init__(self, size: int) -> None:
+        self._lock = threading.Lock()
+        self._recent: deque[dict] = deque()
+        self._ids: set[int] = set()
+        self._size = size
+        self._subs: set[Subscriber] = set()
+        # The buffer holds every event with id > floor.
+        self.floor = 0
+        self.last_id = 0
+        self._started = False
+        self._listener: Optional[threading.Thread] = None
+
+    def publish(self, ev: dict) -> None:
+        with self._lock:
+            if ev["id"] in self._ids or ev["id"] <= self.floor:
+                return
+            self._recent.append(ev)
+            self._ids.add(ev["id"])
+            while len(self._recent) > self._size:
+                old = self._recent.popleft()
+                self._ids.discard(old["id"])
+                self.floor = max(self.floor, old["id"])
+            self.last_id = max(self.last_id, ev["id"])
+            subs = list(self._subs)
+        for s in subs:
+            s.push(ev)
+
+    def since(self, cursor: int) -> Optional[list[dict]]:
+        """Buffered events after `cursor` (in id order), or None if the buffer does not reach back that far."""
+        with self._lock:
+            if cursor < self.floor:
+                return None
+            return sorted((e for e in self._recent if e["id"] > cursor), key=lambda e: e["id"])
+
+    def subscribe(self) -> Subscriber:
+        sub = Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    def start(self) -> None:
+        """Start buffering (and, on Postgres, listening). Blocking; idempotent."""
+        from .db import SessionLocal, engine
+        with self._lock:
+            if not self._started:
+                db = SessionLocal()
+                try:
+                    # Buffer the trailing window too, so late commits below the latest id can still be accepted.
+                    latest = latest_cursor(db)
+                    self.floor = max(latest - settings.EVENTS_REPLAY_WINDOW, 0)
+                    self.last_id = max(self.last_id, latest)
+                    recent = events_after(db, self.floor, settings.EVENTS_REPLAY_WINDOW)
+                finally:
+                    db.close()
+                for ev in recent:
+                    if ev["id"] not in self._ids:
+                        self._recent.append(ev)
+                        self._ids.add(ev["id"])
+                self._started = True
+            if engine.dialect.name != "postgresql":
+                return
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=_listen_forever, name="status-events", daemon=True)
+                self._listener.start()
+
+
+hub = Hub(settings.EVENTS_BUFFER)
+
+
+def events_after(db: Session, cursor: int, limit: int) -> list[dict]:
+    rows = db.execute(
+        select(StatusEvent.id, StatusEvent.payload_json)
+        .where(StatusEvent.id > cursor)
+        .order_by(StatusEvent.id)
+        .limit(limit)
+    ).all()
+    return [{"id": row_id, **json.loads(payload)} for row_id, payload in rows]
+
+
+def latest_cursor(db: Session) -> int:
+    return db.execute(select(func.max(StatusEvent.id))).scalar() or 0
+
+
+def replay(cursor: int) -> Optional[list[dict]]:
+    """Events after `cursor` from the table; None if there are too many (client should reload)."""
+    from .db import SessionLocal
+    db = SessionLocal()
+    try:
+        rows = events_after(db, cursor, settings.EVENTS_BUFFER + 1)
+    finally:
+        db.close()
+    return None if len(rows) > settings.EVENTS_BUFFER else rows
+
+
+def _listen_forever() -> None:
+    import psycopg  # type: ignore
+    from .db import SessionLocal, engine
+
+    conninfo = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    backoff = 1.0
+    while True:
+        try:
+            with psycopg.connect(conninfo, autocommit=True) as conn:
+                conn.execute(f"LISTEN {settings.EVENTS_CHANNEL}")
+                # Catch up on anything committed before LISTEN took effect or while disconnected,
+                # including late commits below the newest id seen (publish dedupes).
+                db = SessionLocal()
+                try:
+                    after = max(hub.last_id - settings.EVENTS_REPLAY_WINDOW, 0)
+                    for ev in events_after(db, after, settings.EVENTS_BUFFER):
+                        hub.publish(ev)
+                finally:
+                    db.close()
+                backoff = 1.0
+                for n in conn.notifies():
+                    try:
+                        hub.publish(json.loads(n.payload))
+                    except (ValueError, KeyError):
+                        log.warning("Ignoring malformed status event: %r", n.payload)
+        except Exception:
+            log.exception("Status event listener failed; reconnecting in %.0fs", backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+def purge_expired(db: Session) -> int:
+    cutoff = datetime.utcnow() - timedelta(hours=settings.EVENTS_RETENTION_HOURS)
+    n = db.execute(delete(StatusEvent).where(StatusEvent.created_at < cutoff)).rowcount
+    db.commit()
+    return n or 0
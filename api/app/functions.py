@@ -4,14 +4,21 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select, func, desc
 from fastapi import HTTPException
 
-from .models import KycSession, Document, LivenessArtifact, KycResult, KycStatus, Embedding, EmbeddingKind
+from .models import KycSession, Document, LivenessArtifact, KycResult, KycStatus, Embedding, EmbeddingKind, MediaAsset, MediaKind, DocumentHash
+from . import cache
+from . import events
+from .config import settings
 import json
+import os
 
 def create_session(db: Session, external_user_id: str) -> KycSession:
     s = KycSession(external_user_id=external_user_id)
     db.add(s)
+    db.flush()
+    events.emit(db, external_user_id, "session", status=KycStatus.NEW.value)
     db.commit()
     db.refresh(s)
+    cache.touch_session(s.id)
     return s
 
 def get_session(db: Session, session_id: int) -> KycSession:
@@ -29,8 +36,10 @@ def add_document(db: Session, session_id: int, doc_type, file_key: str) -> Docum
     if s.status == KycStatus.NEW:
         s.status = KycStatus.DOC_UPLOADED
 
+    events.emit(db, s.external_user_id, "document", status=s.status.value)
     db.commit()
     db.refresh(d)
+    cache.touch_session(session_id)
     return d
 
 def set_liveness(db: Session, session_id: int, video_key: str) -> LivenessArtifact:
@@ -49,10 +58,22 @@ def set_liveness(db: Session, session_id: int, video_key: str) -> LivenessArtifa
     if s.status in (KycStatus.NEW, KycStatus.DOC_UPLOADED):
         s.status = KycStatus.LIVE_UPLOADED
 
+    events.emit(db, s.external_user_id, "liveness", status=s.status.value)
     db.commit()
     db.refresh(artifact)
+    cache.touch_session(session_id)
     return artifact
 
+def attach_liveness_video(db: Session, session_id: int, video_key: str) -> None:
+    """Point an existing liveness artifact at its video; no status change or event (nothing new to review)."""
+    live = db.execute(select(LivenessArtifact).where(LivenessArtifact.session_id == session_id)).scalar_one_or_none()
+    if live is None:
+        return
+    live.video_key = video_key
+    db.commit()
+    cache.touch_session(session_id)
+
+
 def upsert_match_result(db: Session, session_id: int, match_score: float, match_percent: float, model_version: str | None) -> KycResult:
     s = get_session(db, session_id)
 
@@ -75,8 +96,10 @@ def upsert_match_result(db: Session, session_id: int, match_score: float, match_
     # status bump to review-ready
     s.status = KycStatus.READY_FOR_REVIEW
 
+    events.emit(db, s.external_user_id, "match", status=s.status.value, percent=match_percent)
     db.commit()
     db.refresh(out)
+    cache.touch_session(session_id)
     return out
 
 def set_operator_decision(db: Session, session_id: int, decision, note: str | None) -> KycResult:
@@ -101,8 +124,10 @@ def set_operator_decision(db: Session, session_id: int, decision, note: str | No
     else:
         s.status = KycStatus.NEEDS_RETRY
 
+    events.emit(db, s.external_user_id, "decision", status=s.status.value, decision=decision.value)
     db.commit()
     db.refresh(res)
+    cache.touch_session(session_id)
     return res
 
 def list_sessions(db: Session, limit: int = 20, offset: int = 0):
@@ -113,7 +138,16 @@ def list_sessions(db: Session, limit: int = 20, offset: int = 0):
     return items, total
 
 
-def save_embedding(db: Session, session_id: int, kind: EmbeddingKind, vector: list[float], file_key: str | None = None) -> Embedding:
+def save_embedding(
+    db: Session,
+    session_id: int,
+    kind: EmbeddingKind,
+    vector: list[float],
+    file_key: str | None = None,
+    model_version: str | None = None,
+) -> Embedding:
+    from .embedding import face_model_version
+
     # create row; no upsert for now (keep history)
     e = Embedding(
         session_id=session_id,
@@ -121,10 +155,14 @@ def save_embedding(db: Session, session_id: int, kind: EmbeddingKind, vector: li
         dim=len(vector),
         vector_json=json.dumps(vector),
         file_key=file_key,
+        model_version=model_version or face_model_version(),
     )
     db.add(e)
+    flag = "doc_uploaded" if kind == EmbeddingKind.DOCUMENT else "kyc_uploaded"
+    events.emit_for_session(db, session_id, "embedding", **{flag: True})
     db.commit()
     db.refresh(e)
+    cache.touch_session(session_id)
     return e
 
 
@@ -137,3 +175,89 @@ def get_or_create_latest_session(db: Session, external_user_id: str) -> KycSessi
     if s:
         return s
     return create_session(db, external_user_id)
+
+
+def record_media_asset(db: Session, session_id: int, kind: MediaKind, file_key: str) -> MediaAsset:
+    size = os.path.getsize(file_key) if os.path.exists(file_key) else 0
+    a = db.execute(select(MediaAsset).where(MediaAsset.file_key == file_key)).scalar_one_or_none()
+    if a:
+        a.size_bytes = size
+    else:
+        a = MediaAsset(session_id=session_id, kind=kind, file_key=file_key, size_bytes=size)
+        db.add(a)
+        if kind == MediaKind.THUMBNAIL:
+            db.flush()
+            events.emit_for_session(db, session_id, "media", thumbnail=a.id)
+    db.commit()
+    db.refresh(a)
+    if kind == MediaKind.THUMBNAIL:
+        cache.touch_session(session_id)
+    return a
+
+
+def replace_media_file_key(db: Session, session_id: int, old_key: str, new_key: str) -> None:
+    """Point liveness/embedding rows at a new file (e.g. after transcoding) and drop the old asset row."""
+    live = db.execute(select(LivenessArtifact).where(LivenessArtifact.session_id == session_id)).scalar_one_or_none()
+    if live and live.video_key == old_key:
+        live.video_key = new_key
+    for e in db.execute(
+        select(Embedding).where(Embedding.session_id == session_id, Embedding.file_key == old_key)
+    ).scalars():
+        e.file_key = new_key
+    old = db.execute(select(MediaAsset).where(MediaAsset.file_key == old_key)).scalar_one_or_none()
+    if old:
+        db.delete(old)
+    db.commit()
+    cache.touch_session(session_id)
+
+
+def user_storage_report(db: Session, external_user_id: str) -> dict:
+    rows = db.execute(
+        select(MediaAsset)
+        .join(KycSession, MediaAsset.session_id == KycSession.id)
+        .where(KycSession.external_user_id == external_user_id)
+        .order_by(desc(MediaAsset.id))
+    ).scalars().all()
+    by_kind: dict[str, int] = {}
+    for a in rows:
+        by_kind[a.kind.value] = by_kind.get(a.kind.value, 0) + a.size_bytes
+    return {
+        "external_user_id": external_user_id,
+        "total_bytes": sum(by_kind.values()),
+        "by_kind": by_kind,
+        "assets": [
+            {"kind": a.kind.value, "file_key": a.file_key, "size_bytes": a.size_bytes, "created_at": a.created_at.isoformat()}
+            for a in rows
+        ],
+    }
+
+
+def latest_media_asset(db: Session, external_user_id: str, kind: MediaKind) -> MediaAsset | None:
+    return db.execute(
+        select(MediaAsset)
+        .join(KycSession, MediaAsset.session_id == KycSession.id)
+        .where(KycSession.external_user_id == external_user_id, MediaAsset.kind == kind)
+        .order_by(desc(MediaAsset.id))
+        .limit(1)
+    ).scalar_one_or_none()
+
+
+def save_document_hash(db: Session, session_id: int, file_key: str, phash_signed: int) -> DocumentHash:
+    h = DocumentHash(session_id=session_id, file_key=file_key, phash=phash_signed)
+    db.add(h)
+    db.commit()
+    db.refresh(h)
+    return h
+
+
+def document_hashes_after(db: Session, after_id: int, limit: int = 100_000) -> list[tuple[int, int, int]]:
+    """(id, session_id, phash) rows with id > after_id, oldest first."""
+    return [
+        tuple(r)
+        for r in db.execute(
+            select(DocumentHash.id, DocumentHash.session_id, DocumentHash.phash)
+            .where(DocumentHash.id > after_id)
+            .order_by(DocumentHash.id)
+            .limit(limit)
+        ).all()
+    ]
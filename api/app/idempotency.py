@@ -0,0 +1,166 @@
+# api/app/idempotency.py
+"""Idempotent upload handling.
+
+A request is identified by its `Idempotency-Key` header, or by the SHA-256 of
+the uploaded bytes when no header is sent. The first request for a key claims
+it by inserting a PENDING row into `idempotency_records` (unique on key), so a
+duplicate arriving at any worker process sees the claim and waits for the
+stored result instead of running inference again. Within one process the
+waiters share the owner's future; across processes they poll the row.
+
+A key reused with a different body is rejected with 422.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import IdempotencyRecord
+from .storage import content_digest
+
+REPLAY_HEADER = "Idempotent-Replayed"
+
+PENDING = "PENDING"
+DONE = "DONE"
+
+POLL_SECONDS = 0.25
+
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def request_key(scope: str, content: bytes, header_key: str | None = None) -> str:
+    if header_key:
+        return f"{scope}:key:{header_key[:200]}"
+    return f"{scope}:sha256:{content_digest(content)}"
+
+
+def _claim(db: Session, key: str, digest: str) -> tuple[str, dict | None]:
+    """One attempt to own `key`.
+
+    Returns ("replay", result), ("claimed", None) or ("wait", None).
+    Raises 422 if the key was used for a different body.
+    """
+    now = datetime.utcnow()
+    rec = db.execute(select(IdempotencyRecord).where(IdempotencyRecord.key == key)).scalar_one_or_none()
+    if rec is not None and rec.created_at < now - timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS):
+        db.delete(rec)
+        db.commit()
+        rec = None
+
+    if rec is None:
+        db.add(IdempotencyRecord(key=key, response_json="", state=PENDING, request_digest=digest, created_at=now))
+        try:
+            db.commit()
+            return "claimed", None
+        except IntegrityError:
+            # Another worker claimed it first.
+            db.rollback()
+            return "wait", None
+
+    if rec.request_digest and rec.request_digest != digest:
+        db.rollback()
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request body")
+    if rec.state != PENDING:
+        result = json.loads(rec.response_json)
+        db.rollback()
+        return "replay", result
+
+    stale = rec.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_PENDING_TIMEOUT_SECONDS)
+    if stale:
+        # The owner died mid-computation; take the claim over (compare-and-swap on created_at).
+        taken = db.execute(
+            update(IdempotencyRecord)
+            .where(
+                IdempotencyRecord.id == rec.id,
+                IdempotencyRecord.state == PENDING,
+                IdempotencyRecord.created_at == rec.created_at,
+            )
+            .values(created_at=now)
+        ).rowcount
+        db.commit()
+        return ("claimed", None) if taken else ("wait", None)
+    db.rollback()
+    return "wait", None
+
+
+def _complete(db: Session, key: str, result: dict) -> None:
+    db.rollback()
+    db.execute(
+        update(IdempotencyRecord)
+        .where(IdempotencyRecord.key == key, IdempotencyRecord.state == PENDING)
+        .values(state=DONE, response_json=json.dumps(result), created_at=datetime.utcnow())
+    )
+    db.commit()
+
+
+def _release(db: Session, key: str) -> None:
+    """Drop an unfinished claim so the upload can be retried."""
+    db.rollback()
+    db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.key == key, IdempotencyRecord.state == PENDING))
+    db.commit()
+
+
+async def run_once(
+    db: Session,
+    key: str,
+    digest: str,
+    response: Response,
+    compute: Callable[[], Awaitable[dict]],
+) -> dict:
+    """Return the stored result for `key`, wait for another worker's computation, or compute once.
+
+    `digest` is the content digest of the request body. Only successful results
+    (`ok` true) are stored, so failed uploads can be retried.
+    """
+    while True:
+        pending = _inflight.get(key)
+        if pending is not None:
+            response.headers[REPLAY_HEADER] = "true"
+            return await asyncio.shield(pending)
+
+        outcome, stored = await run_in_threadpool(_claim, db, key, digest)
+        if outcome == "replay":
+            response.headers[REPLAY_HEADER] = "true"
+            return stored
+        if outcome == "claimed":
+            break
+        await asyncio.sleep(POLL_SECONDS)
+
+    fut: asyncio.Future = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    try:
+        result = await compute()
+        if result.get("ok"):
+            await run_in_threadpool(_complete, db, key, result)
+        else:
+            await run_in_threadpool(_release, db, key)
+        fut.set_result(result)
+        return result
+    except BaseException as e:
+        try:
+            await asyncio.shield(run_in_threadpool(_release, db, key))
+        except Exception:
+            pass  # the claim goes stale and is taken over later
+        fut.set_exception(e)
+        # Mark retrieved so an exception nobody else awaited is not logged.
+        fut.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+
+def purge_expired(db: Session) -> int:
+    cutoff = datetime.utcnow() - timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+    # Also drops claims abandoned that long ago.
+    n = db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.created_at < cutoff)).rowcount
+    db.commit()
+    return n or 0
@@ -0,0 +1,205 @@
+# api/app/liveness_stream.py
+"""Incremental liveness processing for frames streamed while the user records.
+
+Each connection keeps a rolling FACE aggregate (mean of unit embeddings) and
+only ever has one frame in flight; a newer frame replaces one that has not
+started yet. Work is bounded two ways so many concurrent streams degrade by
+dropping frames instead of queueing:
+
+- per connection, a CPU budget (LIVENESS_STREAM_CPU_SHARE of wall time plus a
+  small burst) measured with thread CPU time around each frame;
+- per process, at most LIVENESS_STREAM_MAX_INFLIGHT frames in inference, each
+  holding an inference share of the admission CPU budget (see admission.py).
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np  # type: ignore
+
+from .admission import INFERENCE, controller
+from .config import settings
+
+_inflight: Optional[asyncio.Semaphore] = None
+
+
+def _budget_cost() -> int:
+    """Share of the admission CPU budget one frame in inference holds (0 with admission off)."""
+    return controller.lanes[INFERENCE].cost if settings.ADMISSION_ENABLED else 0
+
+
+def _global_slots() -> asyncio.Semaphore:
+    global _inflight
+    if _inflight is None:
+        _inflight = asyncio.Semaphore(settings.LIVENESS_STREAM_MAX_INFLIGHT)
+    return _inflight
+
+
+class CpuBudget:
+    """Token bucket over CPU seconds: refills at `share` per wall second, capped at `burst`."""
+
+    def __init__(self, share: float, burst: float) -> None:
+        self.share = share
+        self.burst = burst
+        self.tokens = burst
+        self._last = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.share)
+        self._last = now
+
+    def allow(self) -> bool:
+        self._refill()
+        return self.tokens > 0
+
+    def charge(self, cpu_seconds: float) -> None:
+        self._refill()
+        self.tokens -= cpu_seconds
+
+
+def sharpness(rgb: np.ndarray) -> float:
+    import cv2  # type: ignore
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+@dataclass
+class FrameOutcome:
+    used: bool
+    reason: str = ""
+    vector: Optional[np.ndarray] = None
+    sharpness: float = 0.0
+    cpu_seconds: float = 0.0
+
+
+def process_frame(jpeg: bytes) -> FrameOutcome:
+    """Quality gate + FACE embedding for one frame. Runs in the threadpool.
+
+    Never raises: a bad frame is rejected, it does not end the stream.
+    """
+    t0 = time.thread_time()
+    try:
+        out = _evaluate(jpeg)
+    except Exception as e:  # e.g. cv2.error on a corrupt JPEG
+        out = FrameOutcome(False, f"invalid frame: {e}")
+    out.cpu_seconds = time.thread_time() - t0
+    return out
+
+
+def _evaluate(jpeg: bytes) -> FrameOutcome:
+    from .embedding import _imdecode_rgb, compute_face_embedding
+
+    if not jpeg:
+        return FrameOutcome(False, "empty frame")
+    try:
+        rgb = _imdecode_rgb(jpeg)
+    except RuntimeError as e:
+        return FrameOutcome(False, str(e))
+    sharp = sharpness(rgb)
+    if sharp < settings.LIVENESS_STREAM_MIN_SHARPNESS:
+        return FrameOutcome(False, "blurry", sharpness=sharp)
+    try:
+        emb = compute_face_embedding(jpeg)
+    except RuntimeError as e:
+        return FrameOutcome(False, str(e), sharpness=sharp)
+    return FrameOutcome(True, vector=np.asarray(emb, dtype=np.float32), sharpness=sharp)
+
+
+@dataclass
+class StreamAggregate:
+    total: Optional[np.ndarray] = None
+    count: int = 0
+    best_frame: Optional[bytes] = None
+    best_sharpness: float = -1.0
+    min_consistency: float = 1.0
+    stats: dict = field(default_factory=lambda: {"received": 0, "processed": 0, "dropped": 0, "rejected": 0})
+
+    def add(self, vec: np.ndarray, frame: bytes, sharp: float) -> None:
+        v = vec / (np.linalg.norm(vec) + 1e-8)
+        if self.total is not None:
+            mean = self.total / (np.linalg.norm(self.total) + 1e-8)
+            self.min_consistency = min(self.min_consistency, float(np.dot(mean, v)))
+            self.total = self.total + v
+        else:
+            self.total = v.copy()
+        self.count += 1
+        if sharp > self.best_sharpness:
+            self.best_sharpness = sharp
+            self.best_frame = frame
+
+    def vector(self) -> Optional[list[float]]:
+        if self.total is None:
+            return None
+        return (self.total / (np.linalg.norm(self.total) + 1e-8)).tolist()
+
+    def summary(self) -> dict:
+        return {
+            **self.stats,
+            "embedded": self.count,
+            "consistency": round(self.min_consistency, 4) if self.count > 1 else None,
+        }
+
+
+class LivenessStream:
+    """Per-connection state: latest-frame slot, budget and rolling aggregate."""
+
+    def __init__(self) -> None:
+        self.agg = StreamAggregate()
+        self.budget = CpuBudget(settings.LIVENESS_STREAM_CPU_SHARE, settings.LIVENESS_STREAM_BURST_SECONDS)
+        self._pending: Optional[bytes] = None
+        self._wake = asyncio.Event()
+        self._closed = False
+
+    def offer(self, frame: bytes) -> None:
+        self.agg.stats["received"] += 1
+        if self._pending is not None:
+            self.agg.stats["dropped"] += 1
+        self._pending = frame
+        self._wake.set()
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+
+    async def run(self, on_progress) -> None:
+        """Consume frames until close(); the last pending frame is still processed."""
+        from fastapi.concurrency import run_in_threadpool
+
+        while True:
+            if self._pending is None:
+                if self._closed:
+                    return
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+            frame, self._pending = self._pending, None
+            if self.agg.count >= settings.LIVENESS_STREAM_MAX_EMBEDDINGS or not self.budget.allow():
+                self.agg.stats["dropped"] += 1
+                continue
+            slots = _global_slots()
+            if slots.locked() and not self._closed:
+                # Process is saturated by other streams: shed this frame rather than queue it.
+                self.agg.stats["dropped"] += 1
+                continue
+            cost = _budget_cost()
+            if cost and not controller.budget.try_acquire(cost, controller.lanes[INFERENCE].priority):
+                # Uploads or matches need the CPU: drop the frame, as above.
+                self.agg.stats["dropped"] += 1
+                continue
+            try:
+                async with slots:
+                    out = await run_in_threadpool(process_frame, frame)
+            finally:
+                if cost:
+                    controller.budget.release(cost)
+            self.budget.charge(out.cpu_seconds)
+            self.agg.stats["processed"] += 1
+            if out.used and out.vector is not None:
+                self.agg.add(out.vector, frame, out.sharpness)
+            else:
+                self.agg.stats["rejected"] += 1
+            await on_progress({"type": "progress", **self.agg.summary(), "last": out.reason or "ok"})
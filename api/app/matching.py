@@ -0,0 +1,173 @@
+# api/app/matching.py
+"""Face/document match engine.
+
+All FACE embeddings of a user (or session) are scored against all DOCUMENT
+embeddings in one matrix product, reduced with max / mean / top-k, and mapped
+to a percent through a configurable piecewise-linear calibration curve.
+
+Only embeddings from one model version are compared. During a model upgrade a
+user moves to EMBEDDING_MODEL_VERSION once both a FACE and a DOCUMENT embedding
+exist for it; until then the newest version that has both sides is used.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np  # type: ignore
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import Embedding, EmbeddingKind, KycSession
+
+MODEL_VERSION = "cosine-v1"
+AGGREGATES = ("max", "mean", "topk")
+
+
+@dataclass
+class MatchResult:
+    score: float
+    percent: int
+    face_embedding_id: int
+    document_embedding_id: int
+    pairs: int
+    aggregate: str
+    model_version: str
+
+
+def parse_curve(spec: str) -> tuple[np.ndarray, np.ndarray]:
+    """Parse 'score:percent,...' into sorted x/y arrays for np.interp."""
+    points = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        x, y = part.split(":")
+        points.append((float(x), float(y)))
+    if len(points) < 2:
+        raise ValueError("Calibration curve needs at least two points")
+    points.sort()
+    xs = np.array([p[0] for p in points], dtype=np.float64)
+    ys = np.array([p[1] for p in points], dtype=np.float64)
+    if np.any(np.diff(xs) <= 0):
+        raise ValueError("Calibration curve scores must be distinct")
+    return xs, ys
+
+
+_curve = parse_curve(settings.MATCH_CALIBRATION)
+
+
+def score_to_percent(score: float, curve: Optional[tuple[np.ndarray, np.ndarray]] = None) -> int:
+    xs, ys = curve or _curve
+    return int(round(float(np.clip(np.interp(score, xs, ys), 0.0, 100.0))))
+
+
+def _unit_rows(m: np.ndarray) -> np.ndarray:
+    return m / (np.linalg.norm(m, axis=1, keepdims=True) + 1e-8)
+
+
+def similarity_matrix(faces: np.ndarray, docs: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every face row against every document row (F x D)."""
+    return _unit_rows(faces.astype(np.float32)) @ _unit_rows(docs.astype(np.float32)).T
+
+
+def aggregate(sim: np.ndarray, method: str = "max", k: int = 3) -> tuple[float, tuple[int, int]]:
+    """Reduce a similarity matrix to one score; also returns the (face, doc) index of the best pair."""
+    flat = sim.ravel()
+    best = int(np.argmax(flat))
+    pair = (best // sim.shape[1], best % sim.shape[1])
+    if method == "max":
+        score = float(flat[best])
+    elif method == "mean":
+        score = float(flat.mean())
+    elif method == "topk":
+        k = min(k, flat.size)
+        score = float(np.partition(flat, -k)[-k:].mean())
+    else:
+        raise ValueError(f"Unknown aggregate: {method}")
+    return score, pair
+
+
+def embedding_version(e: Embedding) -> str:
+    return e.model_version or settings.EMBEDDING_LEGACY_VERSION
+
+
+def select_version(faces: Sequence[Embedding], docs: Sequence[Embedding]) -> Optional[str]:
+    """The current model version if both sides have it, else the newest FACE version that docs share."""
+    both = {embedding_version(e) for e in faces} & {embedding_version(e) for e in docs}
+    if not both:
+        return None
+    if settings.EMBEDDING_MODEL_VERSION in both:
+        return settings.EMBEDDING_MODEL_VERSION
+    return next(embedding_version(e) for e in faces if embedding_version(e) in both)
+
+
+def result_version(m: MatchResult) -> str:
+    """Value stored in KycResult.model_version: scoring method and embedding model."""
+    return f"{MODEL_VERSION}/{m.model_version}"
+
+
+def match_embeddings(
+    faces: Sequence[Embedding],
+    docs: Sequence[Embedding],
+    method: Optional[str] = None,
+    k: Optional[int] = None,
+) -> Optional[MatchResult]:
+    """Score FACE rows against DOCUMENT rows. Rows are expected newest first.
+
+    Only rows of the version chosen by `select_version` take part, so embeddings
+    from different models are never compared. Within it, only one dimension is
+    used (the newest FACE row's, if documents have it): rows saved under a
+    mislabelled version must not break the matrix.
+    """
+    version = select_version(faces, docs)
+    if version is None:
+        return None
+    faces = [e for e in faces if embedding_version(e) == version]
+    docs = [e for e in docs if embedding_version(e) == version]
+    doc_dims = {e.dim for e in docs}
+    dim = next((e.dim for e in faces if e.dim in doc_dims), None)
+    if dim is None:
+        return None
+    faces = [e for e in faces if e.dim == dim]
+    docs = [e for e in docs if e.dim == dim]
+    method = method or settings.MATCH_AGGREGATE
+    k = k or settings.MATCH_TOP_K
+
+    f = np.array([json.loads(e.vector_json) for e in faces], dtype=np.float32)
+    d = np.array([json.loads(e.vector_json) for e in docs], dtype=np.float32)
+    score, (i, j) = aggregate(similarity_matrix(f, d), method, k)
+    return MatchResult(
+        score=score,
+        percent=score_to_percent(score),
+        face_embedding_id=faces[i].id,
+        document_embedding_id=docs[j].id,
+        pairs=len(faces) * len(docs),
+        aggregate=method,
+        model_version=version,
+    )
+
+
+def _split(rows: Sequence[Embedding]) -> tuple[list[Embedding], list[Embedding]]:
+    faces = [e for e in rows if e.kind == EmbeddingKind.FACE]
+    docs = [e for e in rows if e.kind == EmbeddingKind.DOCUMENT]
+    return faces, docs
+
+
+def session_embeddings(db: Session, session_id: int) -> tuple[list[Embedding], list[Embedding]]:
+    rows = db.execute(
+        select(Embedding).where(Embedding.session_id == session_id).order_by(Embedding.id.desc())
+    ).scalars().all()
+    return _split(rows)
+
+
+def user_embeddings(db: Session, external_user_id: str) -> tuple[list[Embedding], list[Embedding]]:
+    rows = db.execute(
+        select(Embedding)
+        .join(KycSession, Embedding.session_id == KycSession.id)
+        .where(KycSession.external_user_id == external_user_id)
+        .order_by(Embedding.id.desc())
+    ).scalars().all()
+    return _split(rows)
@@ -0,0 +1,275 @@
+# api/app/media.py
+"""Liveness media helpers and the background transcode/thumbnail pipeline.
+
+Jobs run on a small bounded thread pool with ffmpeg at low CPU priority, so they
+never compete with request-path inference for cores. The queue is in memory; jobs
+lost to a restart are found again at startup by `requeue_unarchived`.
+"""
+from __future__ import annotations
+
+import fcntl
+import logging
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import select
+
+from .config import settings
+from .db import SessionLocal
+from .models import MediaAsset, MediaKind
+from . import admission, functions
+
+log = logging.getLogger(__name__)
+
+MEDIA_DIR = Path("data/media")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _ffmpeg(args: list[str], capture: bool = False, background: bool = False) -> bytes:
+    cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+    if not background:
+        proc = subprocess.run(cmd + args, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return proc.stdout if capture else b""
+    cmd += ["-threads", str(settings.MEDIA_FFMPEG_THREADS)]
+    if settings.MEDIA_NICE and shutil.which("nice"):
+        cmd = ["nice", "-n", str(settings.MEDIA_NICE)] + cmd
+    # Background jobs take their threads from the admission CPU budget, after any waiting request.
+    with admission.controller.background_cpu(settings.MEDIA_FFMPEG_THREADS):
+        proc = subprocess.run(cmd + args, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return proc.stdout if capture else b""
+
+
+def extract_frame(video_path: Path | str) -> bytes:
+    """Return a representative JPEG frame of the video, piped from ffmpeg (no temp file)."""
+    data = _ffmpeg(
+        ["-i", str(video_path), "-vf", "thumbnail,scale=640:-1", "-frames:v", "1", "-f", "image2pipe", "-vcodec", "mjpeg", "-"],
+        capture=True,
+    )
+    if not data:
+        raise RuntimeError("Failed to extract frame from video")
+    return data
+
+
+def probe_duration(path: Path) -> Optional[float]:
+    """Duration in seconds, or None if unknown.
+
+    Browser-recorded WebM often has no duration in its header, so fall back to
+    the last video packet timestamp.
+    """
+    def ffprobe(args: list[str]) -> str:
+        proc = subprocess.run(
+            ["ffprobe", "-v", "error", *args, "-of", "csv=p=0", str(path)],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        return proc.stdout
+
+    try:
+        value = ffprobe(["-show_entries", "format=duration"]).strip()
+        if value and value != "N/A":
+            return float(value)
+        packets = ffprobe(["-select_streams", "v:0", "-show_entries", "packet=pts_time"]).split()
+        times = [float(t) for t in packets if t != "N/A"]
+        return max(times) if times else None
+    except (subprocess.CalledProcessError, ValueError, FileNotFoundError):
+        return None
+
+
+def _parse_bitrate(value: str) -> int:
+    value = value.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip("km")) * scale)
+
+
+def archive_bitrate(duration: float) -> int:
+    """MEDIA_ARCHIVE_BITRATE, lowered so a clip of `duration` seconds fits MEDIA_ARCHIVE_MAX_BYTES."""
+    # 15% headroom for container overhead and VBR overshoot.
+    fit = int(settings.MEDIA_ARCHIVE_MAX_BYTES * 8 * 0.85 / max(duration, 0.1))
+    return max(min(_parse_bitrate(settings.MEDIA_ARCHIVE_BITRATE), fit), 10_000)
+
+
+def transcode_archive(src: Path, dest: Path, duration: float) -> None:
+    """Low-bitrate VP9 archive copy, audio dropped, sized to fit MEDIA_ARCHIVE_MAX_BYTES."""
+    _ffmpeg(
+        [
+            "-i", str(src),
+            "-an",
+            "-vf", f"scale=-2:'min({settings.MEDIA_ARCHIVE_HEIGHT},ih)'",
+            "-c:v", "libvpx-vp9",
+            "-b:v", str(archive_bitrate(duration)),
+            "-deadline", "good",
+            "-cpu-used", "4",
+            str(dest),
+        ],
+        background=True,
+    )
+
+
+def archive_complete(archive: Path, duration: float) -> bool:
+    """True if the archive is within the size cap and covers the whole source clip."""
+    if not archive.exists() or archive.stat().st_size == 0:
+        return False
+    if archive.stat().st_size > settings.MEDIA_ARCHIVE_MAX_BYTES:
+        return False
+    got = probe_duration(archive)
+    return got is not None and abs(got - duration) <= max(0.5, 0.02 * duration)
+
+
+def make_thumbnail(src: Path, dest: Path) -> None:
+    _ffmpeg(["-i", str(src), "-vf", "thumbnail,scale=240:-1", "-frames:v", "1", "-q:v", "5", str(dest)], background=True)
+
+
+def make_frame_strip(src: Path, dest: Path) -> None:
+    n = settings.MEDIA_STRIP_FRAMES
+    _ffmpeg(
+        ["-i", str(src), "-vf", f"fps=2,scale=120:-1,tile={n}x1", "-frames:v", "1", "-q:v", "6", str(dest)],
+        background=True,
+    )
+
+
+def _archive_path(src: Path) -> Path:
+    return MEDIA_DIR / f"{src.stem}.archive.webm"
+
+
+def _failed_marker(src: Path) -> Path:
+    # Written when a clip cannot be archived, so restarts do not retry it forever.
+    return MEDIA_DIR / f"{src.stem}.failed"
+
+
+def process_liveness_video(session_id: int, video_key: str) -> None:
+    """Transcode, thumbnail and strip one liveness upload; records sizes as MediaAssets."""
+    src = Path(video_key)
+    if not src.exists():
+        return
+    MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+    stem = src.stem
+    archive = _archive_path(src)
+    thumb = MEDIA_DIR / f"{stem}.thumb.jpg"
+    strip = MEDIA_DIR / f"{stem}.strip.jpg"
+
+    db = SessionLocal()
+    try:
+        for fn, dest, kind in (
+            (make_thumbnail, thumb, MediaKind.THUMBNAIL),
+            (make_frame_strip, strip, MediaKind.STRIP),
+        ):
+            try:
+                fn(src, dest)
+                functions.record_media_asset(db, session_id, kind, str(dest))
+            except Exception as e:
+                log.warning("media: %s failed for %s: %s", kind.value, src, e)
+
+        duration = probe_duration(src)
+        if duration is None:
+            log.warning("media: unknown duration for %s, keeping the original", src)
+            _failed_marker(src).touch()
+            return
+        try:
+            transcode_archive(src, archive, duration)
+        except Exception as e:
+            log.warning("media: transcode failed for %s: %s", src, e)
+            archive.unlink(missing_ok=True)
+            _failed_marker(src).touch()
+            return
+        if not archive_complete(archive, duration):
+            # Never replace the original with a truncated or oversized copy.
+            log.warning("media: archive of %s is incomplete or over the size cap, keeping the original", src)
+            archive.unlink(missing_ok=True)
+            _failed_marker(src).touch()
+            return
+        functions.record_media_asset(db, session_id, MediaKind.ARCHIVE, str(archive))
+        if not settings.MEDIA_KEEP_ORIGINAL:
+            functions.replace_media_file_key(db, session_id, str(src), str(archive))
+            src.unlink(missing_ok=True)
+    finally:
+        db.close()
+
+
+def schedule_liveness_video(session_id: int, video_key: str) -> bool:
+    """Queue a liveness upload for background processing. Returns False if the pipeline is disabled."""
+    global _executor
+    if settings.MEDIA_WORKERS <= 0:
+        return False
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.MEDIA_WORKERS, thread_name_prefix="media")
+    _executor.submit(_run_job, session_id, video_key)
+    return True
+
+
+def _run_job(session_id: int, video_key: str) -> None:
+    MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+    # A clip can be queued by more than one worker (upload + startup requeue);
+    # the flock is dropped by the kernel if this process dies mid-job.
+    with open(MEDIA_DIR / f"{Path(video_key).stem}.lock", "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        if _is_archived(video_key):
+            return  # done by another worker while this job was queued
+        try:
+            process_liveness_video(session_id, video_key)
+        except Exception:
+            log.exception("media: job failed for %s", video_key)
+
+
+def _is_archived(video_key: str) -> bool:
+    db = SessionLocal()
+    try:
+        archive = str(_archive_path(Path(video_key)))
+        return db.execute(select(MediaAsset.id).where(MediaAsset.file_key == archive)).first() is not None
+    finally:
+        db.close()
+
+
+def requeue_unarchived() -> int:
+    """Queue VIDEO assets that have neither an archive nor a failure marker.
+
+    Covers jobs lost from the in-memory queue when a worker was recycled,
+    crashed or shut down before getting to them.
+    """
+    if settings.MEDIA_WORKERS <= 0:
+        return 0
+    db = SessionLocal()
+    try:
+        videos = db.execute(select(MediaAsset.session_id, MediaAsset.file_key).where(MediaAsset.kind == MediaKind.VIDEO)).all()
+        archived = set(
+            db.execute(select(MediaAsset.file_key).where(MediaAsset.kind == MediaKind.ARCHIVE)).scalars()
+        )
+    finally:
+        db.close()
+    queued = 0
+    for session_id, key in videos:
+        src = Path(key)
+        if not src.exists() or str(_archive_path(src)) in archived or _failed_marker(src).exists():
+            continue
+        schedule_liveness_video(session_id, key)
+        queued += 1
+    if queued:
+        log.info("media: requeued %d unarchived liveness videos", queued)
+    return queued
+
+
+def sweep_intermediate_frames(data_dir: Path = Path("data/liveness")) -> int:
+    """Delete JPEG frames left next to liveness videos by older versions of the upload handlers.
+
+    Those were written as `<video stem>.jpg`; only JPEGs with such a sibling video are removed.
+    """
+    removed = 0
+    if data_dir.exists():
+        for p in data_dir.glob("*.jpg"):
+            if any(p.with_suffix(ext).exists() for ext in (".webm", ".mp4", ".mov", ".mkv")):
+                p.unlink(missing_ok=True)
+                removed += 1
+    return removed
+
+
+def shutdown(wait: bool = False) -> None:
+    """Stop taking jobs. Queued ones are dropped and picked up by `requeue_unarchived` on the next start."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
@@ -1,7 +1,7 @@
 # api/app/models.py
 import enum
 from datetime import datetime
-from sqlalchemy import String, DateTime, Enum, ForeignKey, Float, Text, UniqueConstraint
+from sqlalchemy import BigInteger, String, DateTime, Enum, ForeignKey, Float, Text, UniqueConstraint, inspect, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .db import Base
 
@@ -98,4 +98,119 @@ class Embedding(Base):
     file_key: Mapped[str | None] = mapped_column(String(500), nullable=True)
     dim: Mapped[int] = mapped_column()
     vector_json: Mapped[str] = mapped_column(Text)  # store as JSON array
+    # NULL for rows written before versions were recorded (see EMBEDDING_LEGACY_VERSION)
+    model_version: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class MediaKind(str, enum.Enum):
+    IMAGE = "IMAGE"
+    VIDEO = "VIDEO"
+    ARCHIVE = "ARCHIVE"
+    THUMBNAIL = "THUMBNAIL"
+    STRIP = "STRIP"
+
+
+class MediaAsset(Base):
+    """A stored file and its size, used for per-user storage accounting."""
+    __tablename__ = "media_assets"
+    __table_args__ = (UniqueConstraint("file_key", name="uq_media_assets_file_key"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    session_id: Mapped[int] = mapped_column(ForeignKey("kyc_sessions.id", ondelete="CASCADE"), index=True)
+    kind: Mapped[MediaKind] = mapped_column(Enum(MediaKind), index=True)
+    file_key: Mapped[str] = mapped_column(String(500))
+    size_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class IdempotencyRecord(Base):
+    """Claim on an upload key (PENDING) and, once done, its response replayed for retries."""
+    __tablename__ = "idempotency_records"
+    __table_args__ = (UniqueConstraint("key", name="uq_idempotency_records_key"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    key: Mapped[str] = mapped_column(String(300))
+    response_json: Mapped[str] = mapped_column(Text)
+    # PENDING while a worker computes the result; NULL/DONE once stored.
+    state: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    request_digest: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class UploadState(str, enum.Enum):
+    PENDING = "PENDING"
+    COMPLETE = "COMPLETE"
+
+
+class ResumableUpload(Base):
+    """Server-side state of a chunked (tus-style) upload."""
+    __tablename__ = "resumable_uploads"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    external_user_id: Mapped[str] = mapped_column(String(100), index=True)
+    kind: Mapped[str] = mapped_column(String(50))
+    length: Mapped[int] = mapped_column(BigInteger)
+    offset: Mapped[int] = mapped_column(BigInteger, default=0)
+    part_key: Mapped[str] = mapped_column(String(500))
+    state: Mapped[UploadState] = mapped_column(Enum(UploadState), default=UploadState.PENDING)
+    result_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # When a finalize claimed the upload (state COMPLETE, result_json still NULL).
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+
+class IngestCheckpoint(Base):
+    """Resume point of an offline bulk ingestion job, committed with each batch."""
+    __tablename__ = "ingest_checkpoints"
+
+    job: Mapped[str] = mapped_column(String(500), primary_key=True)
+    next_line: Mapped[int] = mapped_column(BigInteger, default=0)
+    processed: Mapped[int] = mapped_column(BigInteger, default=0)
+    embedded: Mapped[int] = mapped_column(BigInteger, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DocumentHash(Base):
+    """64-bit perceptual hash (stored signed) of an uploaded document image."""
+    __tablename__ = "document_hashes"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    session_id: Mapped[int] = mapped_column(ForeignKey("kyc_sessions.id", ondelete="CASCADE"), index=True)
+    file_key: Mapped[str] = mapped_column(String(500))
+    phash: Mapped[int] = mapped_column(BigInteger, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class StatusEvent(Base):
+    """Status change pushed to dashboards (app/events.py); the id is the resume cursor."""
+    __tablename__ = "status_events"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    external_user_id: Mapped[str] = mapped_column(String(100))
+    kind: Mapped[str] = mapped_column(String(32))
+    payload_json: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+# Columns added to existing tables after they were first created. There are no
+# migrations yet, so create_schema adds them in place.
+_ADDED_COLUMNS = [
+    ("embeddings", "model_version", "VARCHAR(100)"),
+    ("idempotency_records", "state", "VARCHAR(16)"),
+    ("idempotency_records", "request_digest", "VARCHAR(64)"),
+    ("resumable_uploads", "claimed_at", "TIMESTAMP"),
+]
+
+
+def create_schema(bind) -> None:
+    """create_all plus any _ADDED_COLUMNS missing from older databases."""
+    Base.metadata.create_all(bind=bind)
+    insp = inspect(bind)
+    for table, column, ddl in _ADDED_COLUMNS:
+        if column in {c["name"] for c in insp.get_columns(table)}:
+            continue
+        guard = "IF NOT EXISTS " if bind.dialect.name == "postgresql" else ""
+        with bind.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {guard}{column} {ddl}"))
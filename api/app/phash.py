@@ -0,0 +1,194 @@
+# api/app/phash.py
+"""Perceptual hashes for document images and an in-memory near-duplicate index.
+
+A 64-bit DCT pHash is computed per document image and stored in
+`document_hashes`. `HashIndex` answers "which stored hashes are within Hamming
+distance r" with multi-index hashing: the hash is split into 4 x 16-bit chunks;
+by pigeonhole any hash within r differs in at most r // 4 bits in some chunk,
+so only those chunk buckets are probed. Buckets are sorted numpy arrays
+(~40 bytes per document), with a small unsorted buffer for recent inserts that
+is merged in periodically, so tens of millions of hashes fit in memory.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import combinations
+from typing import Optional
+
+import numpy as np  # type: ignore
+
+CHUNKS = 4
+CHUNK_BITS = 16
+_MASK = (1 << CHUNK_BITS) - 1
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def phash(image_bytes: bytes) -> int:
+    """64-bit DCT perceptual hash (unsigned)."""
+    import cv2  # type: ignore
+    arr = np.frombuffer(image_bytes, dtype=np.uint8)
+    gray = cv2.imdecode(arr, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise RuntimeError("Failed to decode image")
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    med = np.median(low[1:])  # ignore the DC term
+    bits = low > med
+    return int(sum(1 << i for i, b in enumerate(bits) if b))
+
+
+def to_signed(h: int) -> int:
+    """Store unsigned 64-bit hashes in a signed BIGINT column."""
+    return h - (1 << 64) if h >= (1 << 63) else h
+
+
+def to_unsigned(h: int) -> int:
+    return h + (1 << 64) if h < 0 else h
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    return _POPCOUNT8[x.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(radius: int) -> np.ndarray:
+    """XOR masks that flip up to `radius` bits of a 16-bit chunk."""
+    out = [0]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), r):
+            out.append(sum(1 << b for b in bits))
+    return np.array(out, dtype=np.uint16)
+
+
+@dataclass
+class HashMatch:
+    row_id: int
+    session_id: int
+    distance: int
+
+
+class HashIndex:
+    """Multi-index hashing over 64-bit hashes. Thread-safe."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._rows = np.empty(0, dtype=np.int64)
+        self._sessions = np.empty(0, dtype=np.int64)
+        # per chunk: sorted chunk values and the positions they came from
+        self._keys = [np.empty(0, dtype=np.uint16) for _ in range(CHUNKS)]
+        self._order = [np.empty(0, dtype=np.int64) for _ in range(CHUNKS)]
+        self._buf: list[tuple[int, int, int]] = []
+        # Highest row id loaded from the database. Local inserts do not move it:
+        # rows are committed out of id order, so a lower id may still appear.
+        self.synced_id = 0
+        # Indexed ids above synced_id - trail, i.e. those a re-scan can return again.
+        self._recent: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._hashes) + len(self._buf)
+
+    def add(self, h: int, row_id: int, session_id: int) -> None:
+        with self._lock:
+            if row_id in self._recent:
+                return
+            self._recent.add(row_id)
+            self._buf.append((h, row_id, session_id))
+            if len(self._buf) >= self._buf_limit():
+                self._merge()
+
+    def _buf_limit(self) -> int:
+        # Re-sorting is O(n log n), so let the unsorted buffer grow with the index.
+        return max(4096, len(self._hashes) // 64)
+
+    def extend(self, hashes: np.ndarray, rows: np.ndarray, sessions: np.ndarray, trail: int) -> None:
+        """Add rows loaded from the database, skipping ids already indexed.
+
+        `rows` may overlap what is indexed as long as they are all above
+        synced_id - trail (the caller re-scans that trailing window). A small
+        delta goes to the append buffer like `add`; only a load that would
+        overflow it (e.g. the cold load) pays for a merge.
+        """
+        if not len(rows):
+            return
+        with self._lock:
+            self.synced_id = max(self.synced_id, int(rows.max()))
+            if self._recent:
+                keep = ~np.isin(rows, np.fromiter(self._recent, dtype=np.int64, count=len(self._recent)))
+                hashes, rows, sessions = hashes[keep], rows[keep], sessions[keep]
+            floor = self.synced_id - trail
+            self._recent = {i for i in self._recent if i > floor}
+            self._recent.update(rows[rows > floor].tolist())
+            if len(self._buf) + len(rows) < self._buf_limit():
+                self._buf.extend(zip(hashes.astype(np.uint64, copy=False).tolist(), rows.tolist(), sessions.tolist()))
+            else:
+                self._merge(hashes, rows, sessions)
+
+    def _merge(self, hashes=None, rows=None, sessions=None) -> None:
+        h_parts, r_parts, s_parts = [self._hashes], [self._rows], [self._sessions]
+        if self._buf:
+            h, r, s = zip(*self._buf)
+            h_parts.append(np.array(h, dtype=np.uint64))
+            r_parts.append(np.array(r, dtype=np.int64))
+            s_parts.append(np.array(s, dtype=np.int64))
+            self._buf = []
+        if hashes is not None and len(hashes):
+            h_parts.append(hashes.astype(np.uint64, copy=False))
+            r_parts.append(rows.astype(np.int64, copy=False))
+            s_parts.append(sessions.astype(np.int64, copy=False))
+        if len(h_parts) == 1:
+            return
+        self._hashes = np.concatenate(h_parts)
+        self._rows = np.concatenate(r_parts)
+        self._sessions = np.concatenate(s_parts)
+        for c in range(CHUNKS):
+            keys = ((self._hashes >> np.uint64(c * CHUNK_BITS)) & np.uint64(_MASK)).astype(np.uint16)
+            order = np.argsort(keys, kind="stable")
+            self._keys[c] = keys[order]
+            self._order[c] = order
+
+    def query(self, h: int, radius: int) -> list[HashMatch]:
+        """Stored hashes within Hamming `radius` of `h`, nearest first."""
+        masks = _flip_masks(radius // CHUNKS)
+        with self._lock:
+            parts: list[np.ndarray] = []
+            for c in range(CHUNKS):
+                q = np.uint16((h >> (c * CHUNK_BITS)) & _MASK)
+                keys, order = self._keys[c], self._order[c]
+                probes = masks ^ q
+                lo = np.searchsorted(keys, probes, side="left")
+                hi = np.searchsorted(keys, probes, side="right")
+                hit = hi > lo
+                parts.extend(order[a:b] for a, b in zip(lo[hit], hi[hit]))
+            out: list[HashMatch] = []
+            if parts:
+                idx = np.unique(np.concatenate(parts))
+                dist = _popcount(self._hashes[idx] ^ np.uint64(h))
+                keep = dist <= radius
+                for i, d in zip(idx[keep], dist[keep]):
+                    out.append(HashMatch(int(self._rows[i]), int(self._sessions[i]), int(d)))
+            if self._buf:
+                bh, brows, bsessions = zip(*self._buf)
+                dist = _popcount(np.array(bh, dtype=np.uint64) ^ np.uint64(h))
+                for i in np.flatnonzero(dist <= radius):
+                    out.append(HashMatch(int(brows[i]), int(bsessions[i]), int(dist[i])))
+        out.sort(key=lambda m: m.distance)
+        return out
+
+
+_index: Optional[HashIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> HashIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = HashIndex()
+        return _index
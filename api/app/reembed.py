@@ -0,0 +1,238 @@
+# api/app/reembed.py
+"""Re-embed stored media with the current face model after a model upgrade.
+
+    python -m app.reembed --workers 2 --rate 20
+
+Walks `embeddings` in id order, picking rows whose model_version (NULL meaning
+EMBEDDING_LEGACY_VERSION) is not the version the workers compute
+(embedding.face_model_version). Each file_key is decoded again (a frame for liveness
+videos) and embedded in batches across a process pool. Rows whose file is gone
+or cannot be embedded are skipped and the cursor moves past them. New rows are written
+next to the old ones with the same session, kind and file_key. Matching switches
+a user to the new version once both sides exist (see matching.select_version).
+
+The id cursor is committed with each batch of rows (IngestCheckpoint, job
+"reembed:<version>"), so the job can be stopped and restarted at any time.
+To keep live traffic unaffected, workers run at low priority with one
+inference thread each. Throughput is capped at --rate images/sec, and
+the job pauses while the 1-minute load average is above --max-load per CPU.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from . import cache
+from .config import settings
+from .db import SessionLocal, engine
+from .models import Embedding, EmbeddingKind, IngestCheckpoint, create_schema
+
+log = logging.getLogger("reembed")
+
+VIDEO_SUFFIXES = {".webm", ".mp4", ".mov", ".mkv"}
+
+# (embedding id, session_id, kind, file_key)
+Item = tuple[int, int, str, str]
+# (embedding id, session_id, kind, file_key, vector or None)
+Result = tuple[int, int, str, str, Optional[list[float]]]
+
+
+def pending_rows(db: Session, version: str, after_id: int, page: int = 1000) -> Iterator[Item]:
+    """Embeddings not yet at `version`, in stored (id) order, starting after `after_id`."""
+    while True:
+        rows = db.execute(
+            select(Embedding.id, Embedding.session_id, Embedding.kind, Embedding.file_key)
+            .where(
+                Embedding.id > after_id,
+                Embedding.file_key.is_not(None),
+                # Legacy rows (NULL) are at EMBEDDING_LEGACY_VERSION, which may already be `version`.
+                func.coalesce(Embedding.model_version, settings.EMBEDDING_LEGACY_VERSION) != version,
+            )
+            .order_by(Embedding.id)
+            .limit(page)
+        ).all()
+        db.commit()  # don't hold one snapshot open for the whole walk
+        if not rows:
+            return
+        for row_id, sid, kind, key in rows:
+            yield row_id, sid, kind.value, key
+        after_id = rows[-1][0]
+
+
+def _init_worker(nice: int) -> None:
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+    settings.ORT_INTRA_OP_THREADS = 1
+    import cv2  # type: ignore
+    cv2.setNumThreads(1)
+    from .embedding import warmup
+    warmup()
+
+
+def _model_version() -> str:
+    from .embedding import face_model_version
+    return face_model_version()
+
+
+def _embed_batch(items: list[Item]) -> list[Result]:
+    from .embedding import compute_face_embeddings
+    from .media import extract_frame
+
+    images: list[bytes] = []
+    for _, _, _, key in items:
+        try:
+            p = Path(key)
+            images.append(extract_frame(key) if p.suffix.lower() in VIDEO_SUFFIXES else p.read_bytes())
+        except Exception:
+            images.append(b"")  # missing or unreadable: no vector, cursor still advances
+    try:
+        vectors = compute_face_embeddings(images)
+    except Exception:
+        # One bad row must not stall the job on this batch; retry item by item.
+        vectors = []
+        for img in images:
+            try:
+                vectors.append(compute_face_embeddings([img])[0])
+            except Exception:
+                vectors.append(None)
+    return [(row_id, sid, kind, key, vec) for (row_id, sid, kind, key), vec in zip(items, vectors)]
+
+
+class Throttle:
+    """Caps images/sec and waits while the host is busy with live traffic."""
+
+    def __init__(self, rate: float, max_load: float) -> None:
+        self.rate = rate
+        self.max_load = max_load
+        self._next = time.monotonic()
+
+    def wait(self, n: int) -> None:
+        if self.max_load > 0 and hasattr(os, "getloadavg"):
+            limit = self.max_load * (os.cpu_count() or 1)
+            while os.getloadavg()[0] > limit:
+                log.info("load %.1f above %.1f, pausing", os.getloadavg()[0], limit)
+                time.sleep(5)
+        if self.rate > 0:
+            now = time.monotonic()
+            if self._next > now:
+                time.sleep(self._next - now)
+            self._next = max(now, self._next) + n / self.rate
+
+
+def write_results(db: Session, job: str, version: str, results: list[Result], cursor: int) -> int:
+    """Insert the new-version rows and advance the cursor, in one transaction."""
+    ok = [r for r in results if r[4] is not None]
+    now = datetime.utcnow()
+    if ok:
+        db.execute(insert(Embedding), [
+            {
+                "session_id": sid,
+                "kind": EmbeddingKind(kind),
+                "file_key": key,
+                "dim": len(vec),
+                "vector_json": json.dumps(vec),
+                "model_version": version,
+                "created_at": now,
+            }
+            for _, sid, kind, key, vec in ok
+        ])
+    ck = db.get(IngestCheckpoint, job) or IngestCheckpoint(job=job, next_line=0, processed=0, embedded=0)
+    ck.next_line = cursor  # last embedding id handled
+    ck.processed = (ck.processed or 0) + len(results)
+    ck.embedded = (ck.embedded or 0) + len(ok)
+    db.add(ck)
+    db.commit()
+    for sid in {r[1] for r in ok}:
+        cache.touch_session(sid)
+    return len(ok)
+
+
+def run(workers: int, batch: int, commit_every: int, rate: float, max_load: float, nice: int) -> dict:
+    create_schema(engine)
+    db = SessionLocal()
+    reader = SessionLocal()
+    throttle = Throttle(rate, max_load)
+    done = embedded = 0
+    pending: list[Result] = []
+    window: deque[Future] = deque()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(nice,)) as pool:
+            # The target is whatever backend the workers loaded (InsightFace pack or ONNX fallback).
+            version = pool.submit(_model_version).result()
+            job = f"reembed:{version}"
+            ck = db.get(IngestCheckpoint, job)
+            start = ck.next_line if ck else 0
+            log.info("re-embedding to %s from id %d", version, start)
+            t0 = time.perf_counter()
+
+            def drain_one() -> None:
+                nonlocal done, embedded
+                # In submission order, so the cursor is a simple watermark.
+                pending.extend(window.popleft().result())
+                if len(pending) >= commit_every:
+                    embedded += write_results(db, job, version, pending, pending[-1][0])
+                    done += len(pending)
+                    pending.clear()
+                    log.info("%d rows (%d embedded), %.1f rows/sec", done, embedded, done / (time.perf_counter() - t0))
+
+            items: list[Item] = []
+            for item in pending_rows(reader, version, start):
+                items.append(item)
+                if len(items) < batch:
+                    continue
+                throttle.wait(len(items))
+                window.append(pool.submit(_embed_batch, items))
+                items = []
+                if len(window) >= workers * 2:
+                    drain_one()
+            if items:
+                window.append(pool.submit(_embed_batch, items))
+            while window:
+                drain_one()
+            if pending:
+                embedded += write_results(db, job, version, pending, pending[-1][0])
+                done += len(pending)
+    finally:
+        reader.close()
+        db.close()
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "job": job,
+        "processed": done,
+        "embedded": embedded,
+        "seconds": round(elapsed, 1),
+        "rows_per_sec": round(done / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.reembed", description="Re-embed stored media with the current model.")
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 4))
+    ap.add_argument("--batch", type=int, default=16, help="images per inference batch")
+    ap.add_argument("--commit-every", type=int, default=500, help="rows per transaction")
+    ap.add_argument("--rate", type=float, default=20.0, help="max images/sec; 0 = unlimited")
+    ap.add_argument("--max-load", type=float, default=0.7, help="pause while load average per CPU exceeds this; 0 = never")
+    ap.add_argument("--nice", type=int, default=19, help="nice level for worker processes")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    summary = run(args.workers, args.batch, args.commit_every, args.rate, args.max_load, args.nice)
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -60,6 +60,7 @@ class EmbeddingOut(BaseModel):
     kind: EmbeddingKind
     file_key: str | None
     dim: int
+    model_version: str | None = None
     created_at: datetime
 
 
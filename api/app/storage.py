@@ -0,0 +1,33 @@
+# api/app/storage.py
+"""Collision-free storage keys for uploaded files."""
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+
+DATA_DIR = Path("data")
+
+
+def content_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def new_file_key(subdir: str, prefix: str, ext: str, digest: str | None = None) -> Path:
+    """data/<subdir>/<prefix>_<ts>_<id>.<ext>; <id> is the content digest prefix or a random uuid."""
+    d = DATA_DIR / subdir
+    d.mkdir(parents=True, exist_ok=True)
+    suffix = digest[:16] if digest else uuid.uuid4().hex[:16]
+    return d / f"{prefix}_{int(time.time())}_{suffix}.{ext}"
+
+
+def write_upload(subdir: str, prefix: str, ext: str, content: bytes) -> Path:
+    """Write content under a fresh key; the file appears atomically or not at all."""
+    dest = new_file_key(subdir, prefix, ext, content_digest(content))
+    tmp = dest.with_name(dest.name + f".{uuid.uuid4().hex[:8]}.part")
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, dest)
+    return dest
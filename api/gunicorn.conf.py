@@ -0,0 +1,95 @@
+# api/gunicorn.conf.py
+# Production server profile: `gunicorn main:app` (picked up automatically from the cwd).
+# All knobs come from app.config.Settings, i.e. environment variables.
+import logging
+import os
+
+from app.config import settings
+
+log = logging.getLogger("gunicorn.error")
+
+
+def _available_cpus() -> list[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - non-Linux
+        return list(range(os.cpu_count() or 1))
+
+
+_cpus = _available_cpus()
+
+bind = settings.WEB_BIND
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = settings.WEB_WORKERS or max(1, len(_cpus) // settings.ORT_INTRA_OP_THREADS)
+max_requests = settings.WORKER_MAX_REQUESTS
+max_requests_jitter = settings.WORKER_MAX_REQUESTS_JITTER
+graceful_timeout = settings.WORKER_GRACEFUL_TIMEOUT
+timeout = settings.WORKER_TIMEOUT
+keepalive = 5
+
+# Import the app in the master so model weights loaded below are shared
+# copy-on-write by every forked worker.
+preload_app = True
+
+# onnxruntime spawns its intra-op thread pool at session creation and those
+# threads do not survive fork(); only single-threaded sessions are safe to
+# create in the master. Otherwise each worker loads its own copy.
+_preload_models = settings.PRELOAD_MODELS and settings.ORT_INTRA_OP_THREADS == 1
+
+
+def on_starting(server):
+    # Schema, sweep and purges once here rather than racing from every worker's startup hook.
+    from app.db import engine
+    from main import MASTER_STARTUP_ENV, run_startup_tasks
+    run_startup_tasks()
+    os.environ[MASTER_STARTUP_ENV] = "1"
+    # Workers inherit the loaded pHash index copy-on-write and only sync the delta.
+    from app.duplicates import warm_index
+    log.info("pHash index warmed with %d hashes", warm_index())
+    engine.dispose()
+
+    if settings.PRELOAD_MODELS and not _preload_models:
+        log.warning("PRELOAD_MODELS ignored: ORT_INTRA_OP_THREADS > 1 is not fork-safe; loading per worker")
+    if _preload_models:
+        from app.embedding import warmup
+        warmup()
+        log.info("Embedding models preloaded in master")
+
+
+def pre_fork(server, worker):
+    # Assign the lowest free CPU slot so a recycled worker takes over its predecessor's cores.
+    used = {getattr(w, "cpu_slot", None) for w in server.WORKERS.values()}
+    slot = 0
+    while slot in used:
+        slot += 1
+    worker.cpu_slot = slot
+
+
+def post_fork(server, worker):
+    # Never share pooled DB connections across processes.
+    from app.db import dispose_engines
+    dispose_engines(close=False)
+
+    per_worker = settings.ORT_INTRA_OP_THREADS
+    try:
+        import cv2  # type: ignore
+        cv2.setNumThreads(per_worker)
+    except Exception:
+        pass
+
+    if settings.CPU_PINNING and hasattr(os, "sched_setaffinity"):
+        start = (worker.cpu_slot * per_worker) % len(_cpus)
+        cores = {_cpus[(start + i) % len(_cpus)] for i in range(per_worker)}
+        os.sched_setaffinity(0, cores)
+        log.info("Worker %s pinned to CPUs %s", worker.pid, sorted(cores))
+
+
+def post_worker_init(worker):
+    # Media jobs run on threads, which do not survive fork, so one worker re-queues
+    # the ones lost to a restart (the slot is reused when that worker is recycled).
+    if worker.cpu_slot == 0:
+        from app.media import requeue_unarchived
+        requeue_unarchived()
+    if settings.PRELOAD_MODELS and not _preload_models:
+        from app.embedding import warmup
+        warmup()
@@ -1,15 +1,44 @@
-from fastapi import FastAPI
+import os
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy import exc as sa_exc
 
-from app.db import engine
-from app.models import Base
+from app.db import engine, SessionLocal, mark_write, pool_stats
+from app import media, idempotency, events, duplicates
+from app.admission import AdmissionMiddleware, controller as admission
+from app.models import create_schema
 from app.api import api_router
 from app.api.sessions import router as sessions_router
+from app.api.uploads import router as uploads_router, purge_expired_uploads
+from app.api.events import router as events_router
+
+
+# Set by the gunicorn master once it has run the startup tasks, inherited by its workers.
+MASTER_STARTUP_ENV = "KYC_MASTER_STARTUP_DONE"
+
+
+def run_startup_tasks() -> None:
+    """Schema, stale-file sweep and purges: once per deployment, not once per worker."""
+    # MVP: auto-create tables
+    create_schema(engine)
+    media.sweep_intermediate_frames()
+    db = SessionLocal()
+    try:
+        idempotency.purge_expired(db)
+        purge_expired_uploads(db)
+        events.purge_expired(db)
+    finally:
+        db.close()
 
 
 def create_app() -> FastAPI:
     app = FastAPI()
 
+    # Lanes/limits per route class; added first so CORS headers still wrap 503s.
+    app.add_middleware(AdmissionMiddleware)
+
     # CORS (local dev defaults). Adjust if needed for other environments.
     app.add_middleware(
         CORSMiddleware,
@@ -17,19 +46,53 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["Location", "Upload-Offset", "Upload-Length", "Upload-Expires", "Idempotent-Replayed", "ETag"],
     )
 
+    @app.middleware("http")
+    async def read_your_writes(request: Request, call_next):
+        response = await call_next(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+            mark_write(response)
+        return response
+
+    @app.exception_handler(sa_exc.TimeoutError)
+    async def pool_exhausted(request: Request, e: sa_exc.TimeoutError):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Database busy, retry shortly"},
+            headers={"Retry-After": "1"},
+        )
+
     @app.on_event("startup")
     def on_startup():
-        # MVP: auto-create tables
-        Base.metadata.create_all(bind=engine)
+        # Under gunicorn the master did these once in on_starting (see gunicorn.conf.py).
+        if not os.environ.get(MASTER_STARTUP_ENV):
+            run_startup_tasks()
+            media.requeue_unarchived()
+        # Full load in dev; under gunicorn the master already loaded it, so only the delta.
+        duplicates.warm_index()
+
+    @app.on_event("shutdown")
+    def on_shutdown():
+        media.shutdown()
 
     @app.get("/health")
     def health():
         return {"ok": True}
 
+    @app.get("/metrics/db")
+    def db_metrics():
+        return {"pools": pool_stats()}
+
+    @app.get("/metrics/admission")
+    def admission_metrics():
+        return admission.stats()
+
     # Routers
     api_router.include_router(sessions_router)
+    api_router.include_router(uploads_router)
+    api_router.include_router(events_router)
     app.include_router(api_router)
 
     return app
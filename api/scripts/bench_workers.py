@@ -0,0 +1,107 @@
+"""Throughput vs. worker count for the gunicorn production profile.
+
+Starts `gunicorn main:app` once per worker count, drives it with a fixed
+number of concurrent clients and prints requests/sec and latency percentiles.
+
+    python scripts/bench_workers.py --workers 1,2,4 --image sample_face.jpg
+
+With --image each request is a document upload (face embedding, CPU bound);
+without it the read-only GET --path is used.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+def _multipart(image: bytes) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="document.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + image + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def _request(base: str, path: str, image: bytes | None, i: int) -> float:
+    t0 = time.perf_counter()
+    if image is None:
+        req = urllib.request.Request(base + path)
+    else:
+        body, ctype = _multipart(image)
+        req = urllib.request.Request(
+            f"{base}/users/bench-{i % 50}/document-image", data=body, headers={"Content-Type": ctype}, method="POST"
+        )
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        resp.read()
+    return time.perf_counter() - t0
+
+
+def _wait_healthy(base: str, deadline: float) -> None:
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base + "/health", timeout=2):
+                return
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError("server did not become healthy")
+
+
+def run_one(workers: int, args, image: bytes | None) -> dict:
+    env = dict(os.environ, WEB_WORKERS=str(workers), WEB_BIND=f"127.0.0.1:{args.port}")
+    proc = subprocess.Popen(
+        ["gunicorn", "main:app"], cwd=Path(__file__).resolve().parents[1], env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        _wait_healthy(base, time.time() + args.startup_timeout)
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(lambda i: _request(base, args.path, image, i), range(args.concurrency)))  # warm-up
+            t0 = time.perf_counter()
+            lat = list(pool.map(lambda i: _request(base, args.path, image, i), range(args.requests)))
+            elapsed = time.perf_counter() - t0
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+    lat.sort()
+    return {
+        "workers": workers,
+        "rps": args.requests / elapsed,
+        "p50_ms": statistics.median(lat) * 1000,
+        "p95_ms": lat[int(0.95 * (len(lat) - 1))] * 1000,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--path", default="/users/summary")
+    ap.add_argument("--image", type=Path, help="JPEG to upload per request (CPU-bound benchmark)")
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--startup-timeout", type=float, default=120.0)
+    args = ap.parse_args()
+
+    image = args.image.read_bytes() if args.image else None
+    rows = [run_one(int(w), args, image) for w in args.workers.split(",")]
+    base_rps = rows[0]["rps"]
+    print(f"{'workers':>7} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for r in rows:
+        print(f"{r['workers']:>7} {r['rps']:>9.1f} {r['rps'] / base_rps:>7.2f}x {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
 const API_BASE = "/api";
 
+// The server refused an upload request in a way a retry cannot fix.
+class UploadRejected extends Error {}
+
 export type KycStatus =
   | "NEW"
   | "DOC_UPLOADED"
@@ -41,11 +44,44 @@ export type SessionListOut = {
   offset: number;
 };
 
+export type LivenessStreamProgress = {
+  type: "progress";
+  received: number;
+  processed: number;
+  dropped: number;
+  rejected: number;
+  embedded: number;
+  consistency: number | null;
+  last: string;
+};
+
+export type LivenessStreamResult = Omit<LivenessStreamProgress, "type" | "last"> & {
+  type: "result";
+  ok: boolean;
+  message?: string;
+  file_key?: string;
+  embedding_dim?: number;
+};
+
+export type StatusEvent = {
+  id: number;
+  user: string;
+  kind: "session" | "document" | "liveness" | "embedding" | "match" | "decision" | "media" | "refresh";
+  status?: KycStatus;
+  percent?: number | null;
+  doc_uploaded?: boolean;
+  kyc_uploaded?: boolean;
+  decision?: Decision;
+  thumbnail?: number;
+};
+
 export type UserSummary = {
   external_user_id: string;
   doc_uploaded: boolean;
   kyc_uploaded: boolean;
   percent: number | null;
+  // Thumbnail asset id, null until the media pipeline has made one.
+  thumbnail: number | null;
 };
 
 async function http<T>(path: string, init?: RequestInit): Promise<T> {
@@ -125,6 +161,55 @@ export const api = {
     }
     return res.json() as Promise<{ ok: boolean; message?: string; file_key?: string; embedding_dim?: number }>;
   },
+  // Resumable (tus-style) liveness upload: create, PATCH chunks, finalize.
+  // On a dropped connection it asks the server for its offset and continues from there.
+  // archiveOnly: liveness was already processed from the stream, so the server only archives the video.
+  uploadLivenessVideoResumable: async (
+    external_user_id: string,
+    file: Blob,
+    { archiveOnly = false, chunkSize = 1024 * 1024 }: { archiveOnly?: boolean; chunkSize?: number } = {},
+  ) => {
+    const created = await http<{ upload_id: string }>(
+      `/users/${encodeURIComponent(external_user_id)}/liveness-video/uploads`,
+      { method: "POST", headers: { "Upload-Length": String(file.size) } },
+    );
+    const url = `${API_BASE}/uploads/${created.upload_id}`;
+    let offset = 0;
+    let failures = 0;
+    while (offset < file.size) {
+      try {
+        const res = await fetch(url, {
+          method: "PATCH",
+          headers: { "Upload-Offset": String(offset), "Content-Type": "application/offset+octet-stream" },
+          body: file.slice(offset, offset + chunkSize),
+        });
+        if (res.status === 409 && !res.headers.has("Upload-Offset")) {
+          // Not an offset mismatch (e.g. already finalized): re-read the offset once, else give up.
+          const head = await fetch(url, { method: "HEAD" });
+          const serverOffset = head.ok ? Number(head.headers.get("Upload-Offset")) : NaN;
+          if (!(serverOffset > offset)) {
+            const text = await res.text().catch(() => "");
+            throw new UploadRejected(`${res.status} ${res.statusText} ${text}`);
+          }
+          offset = serverOffset;
+          failures = 0;
+          continue;
+        }
+        if (!res.ok && res.status !== 409) throw new Error(`${res.status} ${res.statusText}`);
+        offset = Number(res.headers.get("Upload-Offset") ?? offset);
+        failures = 0;
+      } catch (e) {
+        if (e instanceof UploadRejected || ++failures > 5) throw e;
+        await new Promise((r) => setTimeout(r, 500 * 2 ** failures));
+        const head = await fetch(url, { method: "HEAD" }).catch(() => null);
+        if (head?.ok) offset = Number(head.headers.get("Upload-Offset") ?? offset);
+      }
+    }
+    return http<{ ok: boolean; message?: string; file_key?: string; embedding_dim?: number }>(
+      `/uploads/${created.upload_id}/finalize${archiveOnly ? "?archive_only=true" : ""}`,
+      { method: "POST" },
+    );
+  },
   uploadDocumentImageByUser: async (external_user_id: string, file: Blob) => {
     const form = new FormData();
     form.append("file", file, "document.jpg");
@@ -149,8 +234,17 @@ export const api = {
       const text = await res.text().catch(() => "");
       throw new Error(`${res.status} ${res.statusText} ${text}`);
     }
-    return res.json() as Promise<{ items: UserSummary[] }>;
+    return res.json() as Promise<{ items: UserSummary[]; cursor: number }>;
+  },
+  // Server-sent status deltas; resume from the cursor returned by listUserSummary.
+  openStatusEvents: (cursor: number) => new EventSource(`${API_BASE}/events/status?cursor=${cursor}`),
+  openLivenessStream: (external_user_id: string) => {
+    const proto = window.location.protocol === "https:" ? "wss:" : "ws:";
+    return new WebSocket(`${proto}//${window.location.host}${API_BASE}/users/${encodeURIComponent(external_user_id)}/liveness-stream`);
   },
+  // Versioned by asset id so the browser can cache it.
+  userThumbnailUrl: (external_user_id: string, thumbnail: number) =>
+    `${API_BASE}/users/${encodeURIComponent(external_user_id)}/thumbnail?v=${thumbnail}`,
   userComputeMatch: async (external_user_id: string) => {
     const res = await fetch(`${API_BASE}/users/${encodeURIComponent(external_user_id)}/match/compute`, { method: "POST" });
     if (!res.ok) {
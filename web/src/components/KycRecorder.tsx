@@ -1,11 +1,15 @@
 import { useEffect, useRef, useState } from "react";
 import { Alert, Button, Spinner } from "./ui";
+import { useLivenessStream } from "../lib/useLivenessStream";
+import type { LivenessStreamResult } from "../api";
 
 type Props = {
-  onSubmit: (blob: Blob) => Promise<void> | void;
+  onSubmit: (blob: Blob, streamed: LivenessStreamResult | null) => Promise<void> | void;
+  // When set, frames are streamed for incremental liveness processing while recording.
+  streamUserId?: string;
 };
 
-export function KycRecorder({ onSubmit }: Props) {
+export function KycRecorder({ onSubmit, streamUserId }: Props) {
   const videoRef = useRef<HTMLVideoElement | null>(null);
   const streamRef = useRef<MediaStream | null>(null);
   const mediaRecorderRef = useRef<MediaRecorder | null>(null);
@@ -15,6 +19,7 @@ export function KycRecorder({ onSubmit }: Props) {
   const [recordedBlob, setRecordedBlob] = useState<Blob | null>(null);
   const [err, setErr] = useState("");
   const [submitting, setSubmitting] = useState(false);
+  const live = useLivenessStream();
 
   // Start camera immediately on mount
   useEffect(() => {
@@ -44,6 +49,7 @@ export function KycRecorder({ onSubmit }: Props) {
     })();
     return () => {
       cancelled = true;
+      live.stop();
       if (streamRef.current) {
         streamRef.current.getTracks().forEach((t) => t.stop());
         streamRef.current = null;
@@ -78,6 +84,7 @@ export function KycRecorder({ onSubmit }: Props) {
         } catch {}
       }
       mr.start();
+      if (streamUserId && v) live.start(streamUserId, v);
       setRecording(true);
     } catch (e: any) {
       setErr(e?.message || String(e));
@@ -100,7 +107,8 @@ export function KycRecorder({ onSubmit }: Props) {
       }
       const blob = recordedBlob || (chunksRef.current.length ? new Blob(chunksRef.current, { type: "video/webm" }) : null);
       if (!blob) throw new Error("Nothing recorded. Click Start Recording first.");
-      await onSubmit(blob);
+      const streamed = await live.finish().catch(() => null);
+      await onSubmit(blob, streamed);
     } catch (e: any) {
       setErr(e?.message || String(e));
     } finally {
@@ -122,6 +130,11 @@ export function KycRecorder({ onSubmit }: Props) {
           {submitting ? (<><Spinner className="mr-2"/>Submitting...</>) : "Submit"}
         </Button>
       </div>
+      {recording && live.progress ? (
+        <div className="text-xs text-slate-600">
+          Frames analysed: {live.progress.embedded} ({live.progress.last})
+        </div>
+      ) : null}
       <div className="text-xs text-slate-600">Move head left, right and blink before submitting.</div>
     </div>
   );
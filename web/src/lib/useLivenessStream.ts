@@ -0,0 +1,72 @@
+import { useRef, useState } from "react";
+import { api, LivenessStreamProgress, LivenessStreamResult } from "../api";
+
+const FRAME_INTERVAL_MS = 200;
+
+// Streams JPEG frames from a <video> element to the API while recording, so the
+// liveness embedding is ready shortly after the user stops.
+export function useLivenessStream() {
+  const wsRef = useRef<WebSocket | null>(null);
+  const timerRef = useRef<number | null>(null);
+  const resultRef = useRef<Promise<LivenessStreamResult> | null>(null);
+  const [progress, setProgress] = useState<LivenessStreamProgress | null>(null);
+
+  function start(externalUserId: string, video: HTMLVideoElement) {
+    stop();
+    setProgress(null);
+    const ws = api.openLivenessStream(externalUserId);
+    ws.binaryType = "arraybuffer";
+    wsRef.current = ws;
+    resultRef.current = new Promise((resolve, reject) => {
+      ws.onmessage = (e) => {
+        const msg = JSON.parse(e.data);
+        if (msg.type === "progress") setProgress(msg);
+        else if (msg.type === "result") resolve(msg);
+      };
+      ws.onerror = () => reject(new Error("Liveness stream failed"));
+      ws.onclose = () => reject(new Error("Liveness stream closed"));
+    });
+    // Avoid unhandled rejections when the caller never awaits finish().
+    resultRef.current.catch(() => {});
+
+    const canvas = document.createElement("canvas");
+    let busy = false;
+    timerRef.current = window.setInterval(() => {
+      if (busy || ws.readyState !== WebSocket.OPEN || !video.videoWidth) return;
+      // Skip rather than queue if the socket is backed up.
+      if (ws.bufferedAmount > 0) return;
+      canvas.width = video.videoWidth;
+      canvas.height = video.videoHeight;
+      canvas.getContext("2d")?.drawImage(video, 0, 0);
+      busy = true;
+      canvas.toBlob(async (blob) => {
+        busy = false;
+        if (blob && ws.readyState === WebSocket.OPEN) ws.send(await blob.arrayBuffer());
+      }, "image/jpeg", 0.85);
+    }, FRAME_INTERVAL_MS);
+  }
+
+  function stop() {
+    if (timerRef.current !== null) {
+      window.clearInterval(timerRef.current);
+      timerRef.current = null;
+    }
+  }
+
+  async function finish(): Promise<LivenessStreamResult | null> {
+    stop();
+    const ws = wsRef.current;
+    const result = resultRef.current;
+    if (!ws || !result) return null;
+    wsRef.current = null;
+    resultRef.current = null;
+    if (ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify({ type: "end" }));
+    try {
+      return await result;
+    } finally {
+      ws.close();
+    }
+  }
+
+  return { start, finish, stop, progress };
+}
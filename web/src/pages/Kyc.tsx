@@ -54,13 +54,22 @@ export function KycPage() {
 
       {started ? (
         <Section title="2) Liveness Recording (video)">
-          <KycRecorder onSubmit={async (blob) => {
+          <KycRecorder streamUserId={externalUserId || undefined} onSubmit={async (blob, streamed) => {
             if (!externalUserId) { setErr("Enter user_id first"); return; }
+            if (streamed?.ok) {
+              // Already processed from the stream: archive the video in the background, don't make the user wait.
+              setErr("");
+              setMsg(`Liveness processed from ${streamed.embedded} frames.`);
+              api.uploadLivenessVideoResumable(externalUserId, blob, { archiveOnly: true })
+                .catch((e) => console.warn("Liveness video archive upload failed", e));
+              return;
+            }
             try {
               setErr("");
               setMsg("");
               setLoading((s) => ({ ...s, upload: true }));
-              const res = await api.uploadLivenessVideoByUser(externalUserId, blob);
+              // Fallback path: the server embeds from the uploaded video.
+              const res = await api.uploadLivenessVideoResumable(externalUserId, blob);
               setMsg(`Liveness video uploaded. ${res.ok ? "" : res.message || ""}`);
             } catch (e: any) {
               setErr(e.message || String(e));
@@ -1,5 +1,5 @@
-import { useEffect, useMemo, useState } from "react";
-import { api, type UserSummary } from "../api";
+import { useEffect, useMemo, useRef, useState } from "react";
+import { api, type StatusEvent, type UserSummary } from "../api";
 import { Alert, Button, Card, CardBody, CardHeader, CardTitle, Field, Input, Label } from "../components/ui";
 
 export function StatusPage() {
@@ -8,13 +8,48 @@ export function StatusPage() {
   const [err, setErr] = useState("");
   const [loading, setLoading] = useState(true);
   const [query, setQuery] = useState("");
+  const eventsRef = useRef<EventSource | null>(null);
+  const reloadTimer = useRef<number | null>(null);
+  // Newest event id applied per user. Replays repeat a window of recent ids (events can
+  // commit out of id order), so skip anything already applied.
+  const appliedRef = useRef<Map<string, number>>(new Map());
 
+  function applyEvent(ev: StatusEvent) {
+    if ((appliedRef.current.get(ev.user) ?? 0) >= ev.id) return;
+    appliedRef.current.set(ev.user, ev.id);
+    if (ev.kind === "refresh") {
+      // Bulk import: reload once things settle.
+      if (reloadTimer.current === null) {
+        reloadTimer.current = window.setTimeout(() => { reloadTimer.current = null; loadList(); }, 2000);
+      }
+      return;
+    }
+    setItems((prev) => {
+      const i = prev.findIndex((u) => u.external_user_id === ev.user);
+      const row: UserSummary = i >= 0
+        ? { ...prev[i] }
+        : { external_user_id: ev.user, doc_uploaded: false, kyc_uploaded: false, percent: null, thumbnail: null };
+      if (ev.doc_uploaded !== undefined) row.doc_uploaded = ev.doc_uploaded;
+      if (ev.kyc_uploaded !== undefined) row.kyc_uploaded = ev.kyc_uploaded;
+      if (ev.percent !== undefined) row.percent = ev.percent;
+      if (ev.thumbnail !== undefined) row.thumbnail = ev.thumbnail;
+      return i >= 0 ? prev.map((u, j) => (j === i ? row : u)) : [...prev, row];
+    });
+  }
+
+  // Load once, then apply pushed deltas; EventSource reconnects with Last-Event-ID by itself.
   async function loadList() {
     setErr("");
     setLoading(true);
     try {
       const res = await api.listUserSummary();
       setItems(res.items);
+      appliedRef.current = new Map();
+      eventsRef.current?.close();
+      const es = api.openStatusEvents(res.cursor);
+      es.addEventListener("status", (e) => applyEvent(JSON.parse((e as MessageEvent).data)));
+      es.addEventListener("reset", () => loadList());
+      eventsRef.current = es;
     } catch (e: any) {
       setErr(e.message || String(e));
     } finally {
@@ -26,6 +61,10 @@ export function StatusPage() {
 
   useEffect(() => {
     loadList();
+    return () => {
+      eventsRef.current?.close();
+      if (reloadTimer.current !== null) window.clearTimeout(reloadTimer.current);
+    };
   }, []);
 
   const filtered = useMemo(() => {
@@ -65,6 +104,7 @@ export function StatusPage() {
               <table className="w-full text-sm">
                 <thead className="bg-slate-50 text-left text-slate-600">
                   <tr>
+                    <th className="px-3 py-2 font-medium">Preview</th>
                     <th className="px-3 py-2 font-medium">User ID</th>
                     <th className="px-3 py-2 font-medium">Doc Uploaded</th>
                     <th className="px-3 py-2 font-medium">KYC Uploaded</th>
@@ -75,6 +115,17 @@ export function StatusPage() {
                 <tbody>
                   {filtered.map((u) => (
                     <tr key={u.external_user_id} className="hover:bg-slate-50">
+                      <td className="px-3 py-2">
+                        {u.thumbnail != null ? (
+                          <img
+                            src={api.userThumbnailUrl(u.external_user_id, u.thumbnail)}
+                            alt=""
+                            loading="lazy"
+                            className="h-10 w-auto rounded"
+                            onError={(e) => { e.currentTarget.style.visibility = "hidden"; }}
+                          />
+                        ) : null}
+                      </td>
                       <td className="px-3 py-2 font-medium text-slate-900">{u.external_user_id}</td>
                       <td className="px-3 py-2">{u.doc_uploaded ? "Yes" : "No"}</td>
                       <td className="px-3 py-2">{u.kyc_uploaded ? "Yes" : "No"}</td>
@@ -83,8 +134,8 @@ export function StatusPage() {
                         <Button onClick={async () => {
                           try {
                             setErr("");
+                            // The new percent arrives as a status event.
                             await api.userComputeMatch(u.external_user_id);
-                            await loadList();
                           } catch (e: any) {
                             setErr(e.message || String(e));
                           }